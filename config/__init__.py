@@ -1,6 +1,7 @@
 """
 Config package.
 """
-from config.settings import settings, get_settings
 
-__all__ = ["settings", "get_settings"]
+from config.settings import Settings, get_settings
+
+__all__ = ["Settings", "get_settings"]
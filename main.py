@@ -12,42 +12,75 @@ Modular monolith architecture with:
   - HTMX-based web interface
   - Authentication and chat
 """
-from contextlib import asynccontextmanager
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+
+from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
 # Load environment variables first
 load_dotenv()
 
-from config.settings import settings
-from shared.persistance.mongo_db import mongo_pool
-from modules.langchain.http_handlers.conversation import router as conversation_router
-from modules.web import pages_router, auth_router, chat_router
+from config.settings import get_settings  # noqa: E402
+from modules.langchain.agents.conversation_agent import ConversationAgent  # noqa: E402
+from modules.langchain.http_handlers.conversation import router as conversation_router  # noqa: E402
+from modules.langchain.services.checkpointer import create_checkpointer  # noqa: E402
+from modules.langchain.services.session_service import SessionService  # noqa: E402
+from modules.web import auth_router, chat_router, pages_router  # noqa: E402
+from modules.web.services.auth_service import AuthService  # noqa: E402
+from shared.persistance.mongo_db import mongo_pool  # noqa: E402
+from shared.services.logger import shutdown_logging  # noqa: E402
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Application lifespan handler.
-    Manages MongoDB connection pool startup/shutdown.
+    Manages MongoDB connection pool startup/shutdown and
+    builds the shared checkpointer and conversation agent.
     """
     # Startup
+    settings = get_settings()
     print("🚀 Starting LLM Service...")
-    
+
     try:
         mongo_pool.connect(settings.MONGO_URI)
+        await mongo_pool.warmup()
         print(f"✅ MongoDB connected to {settings.MONGO_DB}")
+
+        await SessionService().ensure_indexes()
+        auth_service = AuthService()
+        await auth_service.migrate_legacy_tokens()
+        await auth_service.ensure_indexes()
+        print("✅ MongoDB indexes ensured")
     except Exception as e:
         print(f"❌ MongoDB connection failed: {e}")
         raise
-    
+
+    # Built once here so no request ever constructs (or races to construct) them
+    app.state.checkpointer = create_checkpointer(mongo_pool.client)
+    app.state.agent = ConversationAgent(app.state.checkpointer)
+    print("✅ Conversation agent ready")
+
+    session_service = SessionService()
+    touch_flusher = asyncio.create_task(session_service.run_touch_flusher())
+
     yield
-    
+
     # Shutdown
     print("👋 Shutting down LLM Service...")
-    mongo_pool.close()
+    touch_flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await touch_flusher
+    await session_service.flush_touches()
+    await mongo_pool.aclose()
     print("✅ MongoDB connection closed")
+    shutdown_logging()
 
 
 # Create FastAPI app
@@ -56,17 +89,23 @@ app = FastAPI(
     description="Back-end service for LLM conversations with memory persistence",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# CORS middleware
+# CORS middleware (preflight responses cached by browsers for a day)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure for production
+    allow_origins=get_settings().CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
+# Gzip for HTML/JSON; text/event-stream is in Starlette's default
+# exclusion list so SSE responses stream uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+
 # Include routers from modules
 app.include_router(conversation_router)
 
@@ -86,29 +125,44 @@ async def root():
     }
 
 
+# Health check ping result is reused for this many seconds
+HEALTH_PING_TTL = 5.0
+_last_ping: tuple[float, str] = (float("-inf"), "")
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    try:
-        # Test MongoDB connection
-        mongo_pool.client.admin.command("ping")
-        mongo_status = "connected"
-    except Exception as e:
-        mongo_status = f"error: {str(e)}"
-    
+    """Health check endpoint (MongoDB ping cached for HEALTH_PING_TTL seconds)."""
+    global _last_ping
+
+    checked_at, mongo_status = _last_ping
+    now = time.monotonic()
+    if now - checked_at > HEALTH_PING_TTL:
+        try:
+            # Test MongoDB connection without blocking the event loop
+            await mongo_pool.async_client.admin.command("ping")
+            mongo_status = "connected"
+        except Exception as e:
+            mongo_status = f"error: {str(e)}"
+        _last_ping = (now, mongo_status)
+
     return {
         "status": "healthy" if mongo_status == "connected" else "degraded",
         "mongodb": mongo_status,
-        "database": settings.MONGO_DB,
+        "database": get_settings().MONGO_DB,
     }
 
 
 if __name__ == "__main__":
     import uvicorn
-    
+
+    settings = get_settings()
+    # loop/http "auto" resolve to uvloop/httptools when uvicorn[standard] is installed
     uvicorn.run(
         "main:app",
         host=settings.HOST,
         port=settings.PORT,
+        loop="auto",
+        http="auto",
         reload=True,
-    )
\ No newline at end of file
+    )
@@ -3,55 +3,77 @@ Conversation Agent - LangGraph agent for chat conversations.
 
 No global state - uses dependency injection pattern.
 """
-from typing import AsyncGenerator, Any
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
+from collections.abc import AsyncGenerator
+from functools import lru_cache
+from typing import Any
+
 from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.mongodb import MongoDBSaver
 
-from config.settings import settings
+from config.settings import get_settings
 from shared.services.logger import get_logger
 
-
 logger = get_logger(__name__)
 
+# History role per stored message class
+_ROLE_MAP = {
+    HumanMessage: "user",
+    AIMessage: "assistant",
+    SystemMessage: "system",
+    ToolMessage: "tool",
+}
+
+
+@lru_cache(maxsize=4)
+def _get_chat_model(model: str, api_key: str) -> ChatOpenAI:
+    """
+    Shared ChatOpenAI client per model/key.
+
+    Reusing the instance keeps its HTTP connection pool alive across agents.
+    """
+    logger.debug(f"Creating chat model {model}")
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        temperature=0.7,
+        streaming=True,
+    )
+
 
 class ConversationAgent:
     """
     Conversation agent with streaming support.
-    
+
     Uses dependency injection - receives checkpointer instead of
     managing global state.
     """
-    
+
     def __init__(self, checkpointer: MongoDBSaver):
         """
         Initialize agent with checkpointer.
-        
+
         Args:
             checkpointer: MongoDB checkpointer for state persistence
         """
         self._checkpointer = checkpointer
         self._agent = self._create_agent()
         logger.debug("ConversationAgent initialized")
-    
+
     def _create_agent(self) -> Any:
         """Create the LangGraph agent."""
+        settings = get_settings()
         logger.debug(f"Creating agent with model {settings.OPENAI_MODEL}")
-        model = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            temperature=0.7,
-            streaming=True,
-        )
-        
+        model = _get_chat_model(settings.OPENAI_MODEL, settings.OPENAI_API_KEY)
+
         return create_agent(
             model,
             tools=[],  # Add tools from tools/ folder as needed
             checkpointer=self._checkpointer,
         )
-    
+
     async def stream(
         self,
         message: str,
@@ -59,28 +81,27 @@ class ConversationAgent:
     ) -> AsyncGenerator[str, None]:
         """
         Stream conversation response.
-        
+
         Args:
             message: User message
             thread_id: Session/thread identifier for checkpointer
-            
+
         Yields:
             Chunks of AI response text
         """
         logger.info(f"Streaming response for thread {thread_id}")
         config = {"configurable": {"thread_id": thread_id}}
         input_messages = {"messages": [HumanMessage(content=message)]}
-        
+
         async for event in self._agent.astream_events(input_messages, config, version="v2"):
-            kind = event.get("event")
-            
-            if kind == "on_chat_model_stream":
-                content = event.get("data", {}).get("chunk", {})
-                if hasattr(content, "content") and content.content:
-                    yield content.content
-        
+            if event.get("event") != "on_chat_model_stream":
+                continue
+            content = getattr(event["data"]["chunk"], "content", None)
+            if content:
+                yield content
+
         logger.debug(f"Streaming complete for thread {thread_id}")
-    
+
     async def invoke(
         self,
         message: str,
@@ -88,22 +109,19 @@ class ConversationAgent:
     ) -> str:
         """
         Invoke conversation and return complete response.
-        
+
         Args:
             message: User message
             thread_id: Session/thread identifier for checkpointer
-            
+
         Returns:
             Complete AI response text
         """
         logger.info(f"Invoking agent for thread {thread_id}")
         config = {"configurable": {"thread_id": thread_id}}
-        
-        result = await self._agent.ainvoke(
-            {"messages": [HumanMessage(content=message)]},
-            config
-        )
-        
+
+        result = await self._agent.ainvoke({"messages": [HumanMessage(content=message)]}, config)
+
         messages = result.get("messages", [])
         if messages:
             last_message = messages[-1]
@@ -111,35 +129,52 @@ class ConversationAgent:
                 logger.debug(f"Response received for thread {thread_id}")
                 return last_message.content
             return str(last_message.content)
-        
+
         return ""
-    
-    def get_history(self, thread_id: str) -> list[dict]:
+
+    async def get_history(
+        self,
+        thread_id: str,
+        limit: int | None = None,
+        before: str | None = None,
+    ) -> list[dict]:
         """
         Get conversation history for a thread.
-        
+
         Args:
             thread_id: Session/thread identifier
-            
+            limit: Only return the last `limit` messages (None for all)
+            before: Only return messages older than the message with this id
+
         Returns:
-            List of message dicts with role and content
+            List of message dicts with id, role and content
         """
         logger.debug(f"Getting history for thread {thread_id}")
         config = {"configurable": {"thread_id": thread_id}}
-        
+
         try:
-            checkpoint_tuple = self._checkpointer.get_tuple(config)
+            checkpoint_tuple = await self._checkpointer.aget_tuple(config)
             if checkpoint_tuple and checkpoint_tuple.checkpoint:
                 messages = checkpoint_tuple.checkpoint.get("channel_values", {}).get("messages", [])
                 logger.debug(f"Found {len(messages)} messages in history")
+
+                if before is not None:
+                    for index, msg in enumerate(messages):
+                        if msg.id == before:
+                            messages = messages[:index]
+                            break
+                if limit is not None:
+                    messages = messages[-limit:] if limit > 0 else []
+
                 return [
                     {
-                        "role": "user" if isinstance(msg, HumanMessage) else "assistant",
+                        "id": msg.id,
+                        "role": _ROLE_MAP.get(type(msg), "assistant"),
                         "content": msg.content,
                     }
                     for msg in messages
                 ]
         except Exception as e:
             logger.error(f"Error getting history: {e}")
-        
+
         return []
@@ -1,48 +1,64 @@
 """
 Conversation HTTP Handler - SSE streaming endpoint for LLM conversations.
 """
-import json
-from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from functools import lru_cache
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
 
+from config.settings import get_settings
 from modules.langchain.agents.conversation_agent import ConversationAgent
 from modules.langchain.services.session_service import SessionService
-from modules.langchain.services.checkpointer import create_checkpointer
-from shared.persistance.mongo_db import mongo_pool
-
 
 router = APIRouter(prefix="/conversation", tags=["Conversation"])
 
+# SSE chunk coalescing: flush once the buffer reaches this size or age
+SSE_FLUSH_BYTES = 256
+SSE_FLUSH_INTERVAL = 0.02
+
 
 # --- Dependency Injection ---
 
-def get_session_service() -> SessionService:
+
+async def get_session_service() -> SessionService:
     """Dependency: Get session service instance."""
     return SessionService()
 
 
-def get_conversation_agent() -> ConversationAgent:
-    """Dependency: Get conversation agent instance."""
-    checkpointer = create_checkpointer(mongo_pool.client)
-    return ConversationAgent(checkpointer)
+@lru_cache(maxsize=1)
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """Shared cap on in-flight LLM calls (MAX_CONCURRENT_LLM)."""
+    return asyncio.Semaphore(get_settings().MAX_CONCURRENT_LLM)
+
+
+async def get_conversation_agent(request: Request) -> ConversationAgent:
+    """Dependency: Get the conversation agent built at startup."""
+    return request.app.state.agent
 
 
 # --- Request/Response Models ---
 
+
 class ConversationRequest(BaseModel):
     """Request body for conversation endpoint."""
-    session_id: Optional[str] = None  # If None, creates new session
+
+    session_id: str | None = None  # If None, creates new session
     user_id: str
     message: str
-    session_name: Optional[str] = None
+    session_name: str | None = None
     stream: bool = True
 
 
 class ConversationResponse(BaseModel):
     """Response body for non-streaming conversation."""
+
     session_id: str
     thread_id: str
     user_id: str
@@ -52,12 +68,22 @@ class ConversationResponse(BaseModel):
 
 class SessionCreateRequest(BaseModel):
     """Request body for creating a new session."""
+
     user_id: str
-    name: Optional[str] = None
+    name: str | None = None
 
 
 # --- SSE Generator ---
 
+
+def _message_event(chunk: str) -> dict:
+    """Build a `message` SSE event."""
+    return {
+        "event": "message",
+        "data": orjson.dumps({"chunk": chunk}).decode(),
+    }
+
+
 async def event_generator(
     agent: ConversationAgent,
     session_id: str,
@@ -70,41 +96,51 @@ async def event_generator(
         # Send session info first
         yield {
             "event": "session",
-            "data": json.dumps({
-                "session_id": session_id,
-                "thread_id": thread_id,
-                "user_id": user_id,
-            })
+            "data": orjson.dumps(
+                {
+                    "session_id": session_id,
+                    "thread_id": thread_id,
+                    "user_id": user_id,
+                }
+            ).decode(),
         }
-        
-        # Stream the response chunks
+
+        # Stream the response chunks, coalescing tokens into fewer events
         full_response = ""
-        async for chunk in agent.stream(thread_id, message):
-            full_response += chunk
-            yield {
-                "event": "message",
-                "data": json.dumps({"chunk": chunk})
-            }
-        
+        buffer = ""
+        last_flush = time.monotonic()
+        async with _get_llm_semaphore():
+            async for chunk in agent.stream(message=message, thread_id=thread_id):
+                full_response += chunk
+                buffer += chunk
+                now = time.monotonic()
+                if len(buffer) >= SSE_FLUSH_BYTES or now - last_flush > SSE_FLUSH_INTERVAL:
+                    yield _message_event(buffer)
+                    buffer = ""
+                    last_flush = now
+
+        if buffer:
+            yield _message_event(buffer)
+
         # Send completion event
         yield {
             "event": "done",
-            "data": json.dumps({
-                "full_response": full_response,
-                "session_id": session_id,
-                "thread_id": thread_id,
-            })
+            "data": orjson.dumps(
+                {
+                    "full_response": full_response,
+                    "session_id": session_id,
+                    "thread_id": thread_id,
+                }
+            ).decode(),
         }
-        
+
     except Exception as e:
-        yield {
-            "event": "error",
-            "data": json.dumps({"error": str(e)})
-        }
+        yield {"event": "error", "data": orjson.dumps({"error": str(e)}).decode()}
 
 
 # --- Routes ---
 
+
 @router.post("")
 async def conversation(
     request: ConversationRequest,
@@ -113,47 +149,46 @@ async def conversation(
 ):
     """
     Conversation endpoint with LLM.
-    
+
     Supports both streaming (SSE) and non-streaming responses.
-    
+
     - **session_id**: Optional session ID. If not provided, creates new session.
     - **user_id**: User identifier (required for creating new sessions)
     - **message**: User message to send to LLM
     - **session_name**: Optional custom session name (for new sessions)
     - **stream**: If true, returns SSE stream. If false, returns complete response.
-    
+
     ## SSE Events (when stream=true):
     - `session`: Session info with session_id and thread_id
-    - `message`: Chunk of AI response
+    - `message`: Chunk of AI response (tokens coalesced into small batches)
     - `done`: Completion event with full response
     - `error`: Error event if something fails
     """
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-    
+
     if not request.user_id.strip():
         raise HTTPException(status_code=400, detail="user_id is required")
-    
+
     # Get existing session or create new one
     if request.session_id:
-        session = session_service.get_session(request.session_id)
+        # Fetch and bump updated_at in a single round-trip
+        session = await session_service.touch_session(request.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Touch session to update timestamp
-        session_service.touch_session(session.session_id)
-        
+
         session_id = session.session_id
         thread_id = session.thread_id
     else:
         # Create new session
         from shared.models.sessions_model import SessionCreate
-        session_response = session_service.create_session(
+
+        session_response = await session_service.create_session(
             SessionCreate(user_id=request.user_id, name=request.session_name)
         )
         session_id = session_response.session_id
         thread_id = session_response.thread_id
-    
+
     if request.stream:
         return EventSourceResponse(
             event_generator(
@@ -166,8 +201,9 @@ async def conversation(
             media_type="text/event-stream",
         )
     else:
-        response = await agent.invoke(thread_id, request.message)
-        
+        async with _get_llm_semaphore():
+            response = await agent.invoke(message=request.message, thread_id=thread_id)
+
         return ConversationResponse(
             session_id=session_id,
             thread_id=thread_id,
@@ -187,7 +223,8 @@ async def create_session(
         raise HTTPException(status_code=400, detail="user_id is required")
 
     from shared.models.sessions_model import SessionCreate
-    session = session_service.create_session(
+
+    session = await session_service.create_session(
         SessionCreate(user_id=request.user_id, name=request.name)
     )
 
@@ -200,22 +237,35 @@ async def get_session(
     session_service: SessionService = Depends(get_session_service),
 ):
     """Get session info by session_id."""
-    session = session_service.get_session(session_id)
-    
+    session = await session_service.get_session(session_id)
+
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
     return session
 
 
 @router.get("/sessions/user/{user_id}")
 async def list_user_sessions(
     user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    skip: int = Query(0, ge=0),
     session_service: SessionService = Depends(get_session_service),
 ):
-    """List all sessions for a user."""
-    sessions = session_service.list_user_sessions(user_id)
-    return {"sessions": [s.model_dump() for s in sessions]}
+    """
+    Stream a user's sessions as newline-delimited JSON, most recently updated first.
+
+    - **limit**: Page size
+    - **skip**: Number of sessions to skip
+    """
+
+    async def ndjson_lines() -> AsyncIterator[bytes]:
+        async for doc in session_service.iter_user_session_documents(
+            user_id, limit=limit, skip=skip
+        ):
+            yield orjson.dumps(doc) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 
 @router.patch("/session/{session_id}")
@@ -225,11 +275,11 @@ async def update_session(
     session_service: SessionService = Depends(get_session_service),
 ):
     """Update session name."""
-    session = session_service.update_session_name(session_id, name)
-    
+    session = await session_service.update_session_name(session_id, name)
+
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
     return session
 
 
@@ -239,28 +289,35 @@ async def delete_session(
     session_service: SessionService = Depends(get_session_service),
 ):
     """Delete a session."""
-    deleted = session_service.delete_session(session_id)
-    
+    deleted = await session_service.delete_session(session_id)
+
     if not deleted:
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
     return {"message": "Session deleted", "session_id": session_id}
 
 
 @router.get("/session/{session_id}/history")
 async def get_session_history(
     session_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: str | None = None,
     session_service: SessionService = Depends(get_session_service),
     agent: ConversationAgent = Depends(get_conversation_agent),
 ):
-    """Get conversation history for a session."""
-    session = session_service.get_session(session_id)
-    
+    """
+    Get conversation history for a session.
+
+    - **limit**: Return at most the last `limit` messages
+    - **before**: Message id cursor - only return messages older than it
+    """
+    session = await session_service.get_session(session_id)
+
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    history = agent.get_history(session.thread_id)
-    
+
+    history = await agent.get_history(session.thread_id, limit=limit, before=before)
+
     return {
         "session_id": session_id,
         "thread_id": session.thread_id,
@@ -3,75 +3,100 @@ Session Service - Manages user chat sessions with MongoDB persistence.
 
 Uses SessionsModel for data validation and persistence.
 """
-from datetime import datetime, timezone
-from typing import Optional
 
-from pymongo.collection import Collection
+import asyncio
+from collections.abc import AsyncIterator
 
-from shared.persistance.mongo_db import mongo_pool
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+
+from config.settings import get_settings
 from shared.models.sessions_model import (
-    SessionsModel,
     SessionCreate,
     SessionResponse,
-    utc_now,
+    SessionsModel,
 )
+from shared.persistance.mongo_db import mongo_pool
 from shared.services.logger import get_logger
-from config.settings import settings
-
 
 logger = get_logger(__name__)
 
+# Fields needed to build SessionsModel (_id kept for legacy docs without session_id)
+_SESSION_PROJECTION = {
+    "session_id": 1,
+    "thread_id": 1,
+    "user_id": 1,
+    "name": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# Debounced touches: session_ids with unwritten activity, flushed in one bulk write
+TOUCH_FLUSH_INTERVAL = 2.0
+_pending_touches: set[str] = set()
+
 
 class SessionService:
     """
     Service for managing user chat sessions.
-    
+
     - Each session has a unique session_id (UUID)
     - thread_id = session_id (used by LangGraph checkpointer)
     - A user can have multiple sessions
     """
-    
-    def __init__(self, collection: Optional[Collection] = None):
+
+    def __init__(self, collection: AsyncCollection | None = None):
         """
         Initialize session service.
-        
+
         Args:
             collection: MongoDB collection (injected for testing, otherwise uses pool)
         """
         self._collection = collection
-    
+
     @property
-    def collection(self) -> Collection:
-        """Get sessions collection (lazy-loaded from pool if not injected)."""
+    def collection(self) -> AsyncCollection:
+        """Get async sessions collection (lazy-loaded from pool if not injected)."""
         if self._collection is None:
-            self._collection = mongo_pool.get_collection(
-                settings.SESSIONS_COLLECTION,
-                settings.MONGO_DB
+            settings = get_settings()
+            self._collection = mongo_pool.get_async_collection(
+                settings.SESSIONS_COLLECTION, settings.MONGO_DB
             )
         return self._collection
-    
-    def create_session(
+
+    async def ensure_indexes(self) -> None:
+        """
+        Create indexes backing the session lookups.
+
+        Idempotent - safe to call on every startup.
+        """
+        await self.collection.create_index("session_id", unique=True)
+        await self.collection.create_index("thread_id", unique=True)
+        await self.collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+        logger.info("Session indexes ensured")
+
+    async def create_session(
         self,
         data: SessionCreate,
     ) -> SessionResponse:
         """
         Create a new session for a user.
-        
+
         Args:
             data: Session creation data
-            
+
         Returns:
             SessionResponse with session details
         """
         logger.info(f"Creating session for user {data.user_id}")
-        
+
         # Use model to create session with proper validation
         session = data.to_session()
-        
+
         # Persist to MongoDB
-        self.collection.insert_one(session.to_document())
+        await self.collection.insert_one(session.to_document())
         logger.info(f"Session created: {session.session_id}")
-        
+
         return SessionResponse(
             session_id=session.session_id,
             thread_id=session.thread_id,
@@ -81,150 +106,318 @@ class SessionService:
             updated_at=session.updated_at,
             is_new=True,
         )
-    
-    def get_session(self, session_id: str) -> Optional[SessionsModel]:
+
+    async def bulk_create(self, items: list[SessionCreate]) -> list[SessionResponse]:
+        """
+        Create several sessions with a single insert_many round trip.
+
+        Args:
+            items: Session creation data, one per session
+
+        Returns:
+            SessionResponse for each created session, in input order
+        """
+        if not items:
+            return []
+
+        sessions = [item.to_session() for item in items]
+        await self.collection.insert_many(
+            [session.to_document() for session in sessions],
+            ordered=False,
+        )
+        logger.info(f"Created {len(sessions)} sessions")
+
+        return [
+            SessionResponse(
+                session_id=session.session_id,
+                thread_id=session.thread_id,
+                user_id=session.user_id,
+                name=session.name,
+                created_at=session.created_at,
+                updated_at=session.updated_at,
+                is_new=True,
+            )
+            for session in sessions
+        ]
+
+    async def get_session(self, session_id: str) -> SessionsModel | None:
         """
         Get session by session_id.
-        
+
         Args:
             session_id: Unique session identifier
-            
+
         Returns:
             SessionsModel or None if not found
         """
         logger.debug(f"Getting session: {session_id}")
-        doc = self.collection.find_one({"session_id": session_id})
+        doc = await self.collection.find_one(
+            {"session_id": session_id},
+            projection=_SESSION_PROJECTION,
+        )
         if doc:
             return SessionsModel.from_document(doc)
         return None
-    
-    def get_session_by_thread(self, thread_id: str) -> Optional[SessionsModel]:
+
+    async def get_session_by_thread(self, thread_id: str) -> SessionsModel | None:
         """
         Get session by thread_id.
-        
+
         Args:
             thread_id: Thread identifier (same as session_id)
-            
+
         Returns:
             SessionsModel or None if not found
         """
-        doc = self.collection.find_one({"thread_id": thread_id})
+        doc = await self.collection.find_one(
+            {"thread_id": thread_id},
+            projection=_SESSION_PROJECTION,
+        )
         if doc:
             return SessionsModel.from_document(doc)
         return None
-    
-    def list_user_sessions(self, user_id: str) -> list[SessionsModel]:
+
+    async def list_user_sessions(
+        self,
+        user_id: str,
+        limit: int | None = None,
+        skip: int = 0,
+    ) -> list[SessionsModel]:
         """
-        List all sessions for a user.
-        
+        List sessions for a user, most recently updated first.
+
         Args:
             user_id: User identifier
-            
+            limit: Maximum number of sessions to return (None for all)
+            skip: Number of sessions to skip (for pagination)
+
         Returns:
             List of SessionsModel
         """
-        docs = self.collection.find(
-            {"user_id": user_id}
+        cursor = self.collection.find(
+            {"user_id": user_id},
+            projection=_SESSION_PROJECTION,
         ).sort("updated_at", -1)
-        
-        return [SessionsModel.from_document(doc) for doc in docs]
-    
-    def touch_session(self, session_id: str) -> Optional[SessionsModel]:
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        return [SessionsModel.from_document(doc) async for doc in cursor]
+
+    async def iter_user_session_documents(
+        self,
+        user_id: str,
+        limit: int | None = None,
+        skip: int = 0,
+    ) -> AsyncIterator[dict]:
+        """
+        Yield a user's session documents in wire format, newest first.
+
+        Skips the SessionsModel round trip so callers can serialize each
+        document as soon as the cursor produces it.
+
+        Args:
+            user_id: User identifier
+            limit: Maximum number of sessions to yield (None for all)
+            skip: Number of sessions to skip (for pagination)
+
+        Yields:
+            Session documents without the MongoDB ``_id`` field
+        """
+        cursor = self.collection.find(
+            {"user_id": user_id},
+            projection=_SESSION_PROJECTION,
+        ).sort("updated_at", -1)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        async for doc in cursor:
+            legacy_id = doc.pop("_id", None)
+            if "session_id" not in doc:
+                # Legacy documents only carry the id in _id
+                doc["session_id"] = str(legacy_id)
+            doc.setdefault("thread_id", doc["session_id"])
+            yield doc
+
+    async def get_most_recent_session(self, user_id: str) -> SessionsModel | None:
+        """
+        Get the user's most recently updated session.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            SessionsModel or None if the user has no sessions
+        """
+        doc = await self.collection.find_one(
+            {"user_id": user_id},
+            projection=_SESSION_PROJECTION,
+            sort=[("updated_at", DESCENDING)],
+        )
+        if doc:
+            return SessionsModel.from_document(doc)
+        return None
+
+    async def touch_session(self, session_id: str) -> SessionsModel | None:
         """
         Update session's updated_at timestamp.
-        
+
+        The timestamp is set server-side with $currentDate.
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             Updated SessionsModel or None if not found
         """
-        now = utc_now()
-        
-        result = self.collection.find_one_and_update(
+        result = await self.collection.find_one_and_update(
             {"session_id": session_id},
-            {"$set": {"updated_at": now}},
+            {"$currentDate": {"updated_at": True}},
+            projection=_SESSION_PROJECTION,
             return_document=True,
         )
-        
+
         if result:
             return SessionsModel.from_document(result)
         return None
-    
-    def update_session_name(
+
+    def schedule_touch(self, session_id: str) -> None:
+        """
+        Record activity on a session without a database round trip.
+
+        The timestamp is written by the next flush_touches call (every
+        TOUCH_FLUSH_INTERVAL seconds while run_touch_flusher is running).
+
+        Args:
+            session_id: Session identifier
+        """
+        _pending_touches.add(session_id)
+
+    async def flush_touches(self) -> int:
+        """
+        Write all pending touches in a single unordered bulk write.
+
+        updated_at is set with $currentDate, the same database clock used by
+        touch_session. If the write fails the touches are kept for the next
+        flush.
+
+        Returns:
+            Number of sessions flushed
+        """
+        if not _pending_touches:
+            return 0
+
+        pending = set(_pending_touches)
+        _pending_touches.clear()
+        try:
+            await self.collection.bulk_write(
+                [
+                    UpdateOne({"session_id": session_id}, {"$currentDate": {"updated_at": True}})
+                    for session_id in pending
+                ],
+                ordered=False,
+            )
+        except Exception:
+            _pending_touches.update(pending)
+            raise
+        logger.debug(f"Flushed {len(pending)} session touches")
+        return len(pending)
+
+    async def run_touch_flusher(self, interval: float = TOUCH_FLUSH_INTERVAL) -> None:
+        """
+        Flush pending touches every `interval` seconds until cancelled.
+
+        Args:
+            interval: Seconds between flushes
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_touches()
+            except Exception as e:
+                logger.error(f"Error flushing session touches: {e}")
+
+    async def update_session_name(
         self,
         session_id: str,
         name: str,
-    ) -> Optional[SessionsModel]:
+    ) -> SessionsModel | None:
         """
         Update session name.
-        
+
         Args:
             session_id: Session identifier
             name: New session name
-            
+
         Returns:
             Updated SessionsModel or None if not found
         """
-        now = utc_now()
-        
-        result = self.collection.find_one_and_update(
+        result = await self.collection.find_one_and_update(
             {"session_id": session_id},
-            {"$set": {"name": name, "updated_at": now}},
+            {"$set": {"name": name}, "$currentDate": {"updated_at": True}},
+            projection=_SESSION_PROJECTION,
             return_document=True,
         )
-        
+
         if result:
             return SessionsModel.from_document(result)
         return None
-    
-    def delete_session(self, session_id: str) -> bool:
+
+    async def delete_session(self, session_id: str) -> bool:
         """
         Delete a session.
-        
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             True if deleted, False if not found
         """
-        result = self.collection.delete_one({"session_id": session_id})
+        result = await self.collection.delete_one({"session_id": session_id})
         return result.deleted_count > 0
-    
-    def get_or_create_default_session(
+
+    async def get_or_create_default_session(
         self,
         user_id: str,
-        session_name: Optional[str] = None,
+        session_name: str | None = None,
     ) -> SessionResponse:
         """
         Get most recent session for user or create new one.
-        
+
         Useful for single-session flows where you want to continue
         the last conversation or start a new one.
-        
+
         Args:
             user_id: User identifier
             session_name: Optional name for new session
-            
+
         Returns:
             SessionResponse with session details
         """
-        # Get most recent session
-        sessions = self.list_user_sessions(user_id)
-        
-        if sessions:
-            session = sessions[0]  # Most recent (sorted by updated_at desc)
-            self.touch_session(session.session_id)
-            
+        # Touch and return the most recent session in a single round-trip
+        result = await self.collection.find_one_and_update(
+            {"user_id": user_id},
+            {"$currentDate": {"updated_at": True}},
+            sort=[("updated_at", DESCENDING)],
+            projection=_SESSION_PROJECTION,
+            return_document=True,
+        )
+
+        if result:
+            session = SessionsModel.from_document(result)
+
             return SessionResponse(
                 session_id=session.session_id,
                 thread_id=session.thread_id,
                 user_id=session.user_id,
                 name=session.name,
                 created_at=session.created_at,
-                updated_at=utc_now(),
+                updated_at=session.updated_at,
                 is_new=False,
             )
-        
+
         # Create new session
-        return self.create_session(SessionCreate(user_id=user_id, name=session_name))
+        return await self.create_session(SessionCreate(user_id=user_id, name=session_name))
@@ -1,105 +1,143 @@
 """
 Auth HTTP Handler - Authentication routes for web interface.
 """
-from fastapi import APIRouter, Request, Form, Depends
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from pathlib import Path
+from pydantic import ValidationError
 
 from modules.web.services.auth_service import AuthService
-
+from shared.models.users_model import LoginRequest, RegisterRequest
 
 router = APIRouter(prefix="/web/auth", tags=["Web Auth"])
 
-# Templates
-templates_dir = Path(__file__).parent.parent / "templates"
-templates = Jinja2Templates(directory=str(templates_dir))
+
+# Static HTMX fragments, encoded once at import
+PASSWORDS_MISMATCH_HTML = """\
+<div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
+    <p class="text-sm text-red-700">As senhas não coincidem.</p>
+</div>
+""".encode()
+
+PASSWORD_TOO_SHORT_HTML = b"""\
+<div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
+    <p class="text-sm text-red-700">A senha deve ter pelo menos 6 caracteres.</p>
+</div>
+"""
+
+INVALID_EMAIL_HTML = """\
+<div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
+    <p class="text-sm text-red-700">Informe um email válido.</p>
+</div>
+""".encode()
+
+EMAIL_TAKEN_HTML = """\
+<div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
+    <p class="text-sm text-red-700">Este email já está cadastrado.</p>
+</div>
+""".encode()
+
+REGISTER_SUCCESS_HTML = b"""\
+<div class="bg-green-50 border-l-4 border-green-400 p-4 rounded">
+    <p class="text-sm text-green-700">Conta criada com sucesso! Redirecionando...</p>
+</div>
+<script>setTimeout(() => window.location.href = '/web/login', 1500);</script>
+"""
+
+LOGIN_FAILED_HTML = b"""\
+<div class="bg-red-50 border-l-4 border-red-400 p-4 rounded flex">
+    <svg class="h-5 w-5 text-red-400 mr-2" viewBox="0 0 20 20" fill="currentColor">
+        <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 8.586 8.707 7.293z" clip-rule="evenodd"/>
+    </svg>
+    <p class="text-sm text-red-700">Email ou senha incorretos.</p>
+</div>
+"""
+
+LOGIN_REDIRECT_HTML = b"""\
+<script>window.location.href = '/web/chat';</script>
+"""
 
 
 # --- Dependencies ---
 
-def get_auth_service() -> AuthService:
+
+async def get_auth_service() -> AuthService:
     """Dependency: Get auth service instance."""
     return AuthService()
 
 
 # --- Routes ---
 
+# Form fields are validated into the request models inside each handler, not
+# by FastAPI, so a malformed email gets an HTMX fragment instead of a 422 JSON body
+
+
 @router.post("/register")
 async def register(
     request: Request,
-    name: str = Form(...),
-    email: str = Form(...),
-    password: str = Form(...),
-    password_confirm: str = Form(...),
+    name: Annotated[str, Form()],
+    email: Annotated[str, Form()],
+    password: Annotated[str, Form()],
+    password_confirm: Annotated[str, Form()],
     auth_service: AuthService = Depends(get_auth_service),
 ):
     """Handle registration form submission."""
+    try:
+        form = RegisterRequest(
+            name=name,
+            email=email,
+            password=password,
+            password_confirm=password_confirm,
+        )
+    except ValidationError:
+        return HTMLResponse(INVALID_EMAIL_HTML)
+
     # Validate passwords match
-    if password != password_confirm:
-        return HTMLResponse("""
-            <div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
-                <p class="text-sm text-red-700">As senhas não coincidem.</p>
-            </div>
-        """)
-    
+    if form.password != form.password_confirm:
+        return HTMLResponse(PASSWORDS_MISMATCH_HTML)
+
     # Validate password length
-    if len(password) < 6:
-        return HTMLResponse("""
-            <div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
-                <p class="text-sm text-red-700">A senha deve ter pelo menos 6 caracteres.</p>
-            </div>
-        """)
-    
+    if len(form.password) < 6:
+        return HTMLResponse(PASSWORD_TOO_SHORT_HTML)
+
     # Try to register
-    user = auth_service.register(name, email, password)
-    
+    user = await auth_service.register(form.name, form.email, form.password)
+
     if not user:
-        return HTMLResponse("""
-            <div class="bg-red-50 border-l-4 border-red-400 p-4 rounded">
-                <p class="text-sm text-red-700">Este email já está cadastrado.</p>
-            </div>
-        """)
-    
+        return HTMLResponse(EMAIL_TAKEN_HTML)
+
     # Success - redirect to login
-    return HTMLResponse("""
-        <div class="bg-green-50 border-l-4 border-green-400 p-4 rounded">
-            <p class="text-sm text-green-700">Conta criada com sucesso! Redirecionando...</p>
-        </div>
-        <script>setTimeout(() => window.location.href = '/web/login', 1500);</script>
-    """)
+    return HTMLResponse(REGISTER_SUCCESS_HTML)
 
 
 @router.post("/login")
 async def login(
     request: Request,
-    email: str = Form(...),
-    password: str = Form(...),
+    email: Annotated[str, Form()],
+    password: Annotated[str, Form()],
     auth_service: AuthService = Depends(get_auth_service),
 ):
     """Handle login form submission."""
-    token = auth_service.login(email, password)
-    
+    try:
+        form = LoginRequest(email=email, password=password)
+    except ValidationError:
+        return HTMLResponse(LOGIN_FAILED_HTML)
+
+    token = await auth_service.login(form.email, form.password)
+
     if not token:
-        return HTMLResponse("""
-            <div class="bg-red-50 border-l-4 border-red-400 p-4 rounded flex">
-                <svg class="h-5 w-5 text-red-400 mr-2" viewBox="0 0 20 20" fill="currentColor">
-                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 8.586 8.707 7.293z" clip-rule="evenodd"/>
-                </svg>
-                <p class="text-sm text-red-700">Email ou senha incorretos.</p>
-            </div>
-        """)
-    
+        return HTMLResponse(LOGIN_FAILED_HTML)
+
     # Success - set cookie and redirect
-    response = HTMLResponse("""
-        <script>window.location.href = '/web/chat';</script>
-    """)
+    response = HTMLResponse(LOGIN_REDIRECT_HTML)
     response.set_cookie(
         key="auth_token",
         value=token,
         httponly=True,
         max_age=7 * 24 * 60 * 60,  # 7 days
-        samesite="lax"
+        samesite="lax",
     )
     return response
 
@@ -111,10 +149,10 @@ async def logout(
 ):
     """Handle logout."""
     token = request.cookies.get("auth_token")
-    
+
     if token:
-        auth_service.logout(token)
-    
+        await auth_service.logout(token)
+
     response = RedirectResponse(url="/web/login", status_code=302)
     response.delete_cookie("auth_token")
     return response
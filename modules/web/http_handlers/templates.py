@@ -0,0 +1,45 @@
+"""
+Templates - Shared Jinja2 environment for the web handlers.
+"""
+
+from functools import cache
+from pathlib import Path
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from config.settings import get_settings
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
+
+
+def _create_environment() -> Environment:
+    """
+    Build the single Jinja2 environment used by every web handler.
+
+    Compiled templates are cached on disk so new workers unpickle them
+    instead of re-parsing; set TEMPLATES_AUTO_RELOAD during development
+    to pick up template edits without a restart.
+
+    FileSystemBytecodeCache() without a directory uses a per-user cache
+    directory (mode 0o700) and refuses one owned by another user, so
+    nobody else on the host can plant compiled templates.
+    """
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=get_settings().TEMPLATES_AUTO_RELOAD,
+        bytecode_cache=FileSystemBytecodeCache(),
+        cache_size=400,
+    )
+
+
+@cache
+def get_templates() -> Jinja2Templates:
+    """
+    Shared Jinja2Templates, built on first use.
+
+    Resolved lazily so settings are read when the first page renders, not at
+    import; call get_templates.cache_clear() after changing them in tests.
+    """
+    return Jinja2Templates(env=_create_environment())
@@ -1,157 +1,358 @@
 """
 Auth Service - Simple authentication for web interface.
 """
-from datetime import datetime, timezone, timedelta
-from typing import Optional
+
+import asyncio
 import hashlib
+import hmac
 import secrets
+import time
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
 
-from pymongo.collection import Collection
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from bson import Binary
+from pymongo import UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
-from shared.persistance.mongo_db import mongo_pool
+from config.settings import get_settings
 from shared.models.users_model import UsersModel
+from shared.persistance.mongo_db import mongo_pool
 from shared.services.logger import get_logger
-from config.settings import settings
-
 
 logger = get_logger(__name__)
 
+# Shared, thread-safe hasher (argon2id with library default costs)
+_password_hasher = PasswordHasher()
+_ARGON2_PREFIX = "$argon2"
+
+# Resolved cookie tokens are reused for this many seconds (per process)
+TOKEN_CACHE_TTL = 60.0
+TOKEN_CACHE_MAX_SIZE = 10_000
+_token_cache: dict[str, tuple[float, UsersModel]] = {}
+
+# User fields needed to build UsersModel for a cookie (never the password hash)
+_USER_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "name": 1,
+    "email": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# 32 random bytes = 256 bits of entropy per session token
+TOKEN_BYTES = 32
+
+
+def _hash_token(token: str) -> Binary:
+    """SHA-256 of a session token; only the digest is stored, never the token."""
+    return Binary(hashlib.sha256(token.encode()).digest())
+
+
+def _cache_user(token: str, user: UsersModel, expires_at: datetime) -> None:
+    """Cache a resolved token, never past the login session's own expiry."""
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=UTC)
+    remaining = (expires_at - datetime.now(UTC)).total_seconds()
+    if remaining <= 0:
+        return
+
+    if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+        # Dicts keep insertion order - drop the oldest entry
+        _token_cache.pop(next(iter(_token_cache)))
+    _token_cache[token] = (time.monotonic() + min(TOKEN_CACHE_TTL, remaining), user)
+
 
 class AuthService:
     """
     Simple authentication service.
-    
+
     For demo purposes - in production use proper OAuth/JWT.
     """
-    
-    def __init__(self, collection: Optional[Collection] = None):
+
+    def __init__(self, collection: AsyncCollection | None = None):
         self._collection = collection
         self._sessions_collection = None
-    
+
     @property
-    def collection(self) -> Collection:
+    def collection(self) -> AsyncCollection:
         """Get users collection."""
         if self._collection is None:
-            self._collection = mongo_pool.get_collection("users", settings.MONGO_DB)
+            self._collection = mongo_pool.get_async_collection("users", get_settings().MONGO_DB)
         return self._collection
-    
+
     @property
-    def sessions_collection(self) -> Collection:
+    def sessions_collection(self) -> AsyncCollection:
         """Get auth sessions collection (for login tokens)."""
         if self._sessions_collection is None:
-            self._sessions_collection = mongo_pool.get_collection("auth_sessions", settings.MONGO_DB)
+            self._sessions_collection = mongo_pool.get_async_collection(
+                "auth_sessions", get_settings().MONGO_DB
+            )
         return self._sessions_collection
-    
+
+    async def ensure_indexes(self) -> None:
+        """
+        Create indexes backing the login and cookie lookups.
+
+        The TTL index lets MongoDB purge expired login tokens; the
+        expires_at filter in get_user_by_token stays because the TTL
+        monitor only runs about once a minute.
+
+        The plaintext token index predating token hashing is dropped; run
+        migrate_legacy_tokens first so no session lacks a token_hash when
+        the unique index is built.
+
+        Idempotent - safe to call on every startup.
+        """
+        await self.collection.create_index("email", unique=True)
+        await self.collection.create_index("user_id", unique=True)
+        with suppress(OperationFailure):
+            await self.sessions_collection.drop_index("token_1")
+        await self.sessions_collection.create_index("token_hash", unique=True)
+        await self.sessions_collection.create_index("expires_at", expireAfterSeconds=0)
+        logger.info("Auth indexes ensured")
+
+    async def migrate_legacy_tokens(self) -> int:
+        """
+        Convert login sessions stored with a plaintext token to token_hash.
+
+        One-off data migration for sessions created before token hashing:
+        the token is hashed in place and removed, so those users stay
+        logged in. A no-op once every session has been converted.
+
+        Returns:
+            Number of sessions converted
+        """
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"token_hash": _hash_token(doc["token"])}, "$unset": {"token": ""}},
+            )
+            async for doc in self.sessions_collection.find(
+                {"token": {"$exists": True}},
+                projection={"token": 1},
+            )
+        ]
+        if not operations:
+            return 0
+
+        await self.sessions_collection.bulk_write(operations, ordered=False)
+        logger.info(f"Migrated {len(operations)} legacy login sessions to hashed tokens")
+        return len(operations)
+
     def _hash_password(self, password: str) -> str:
-        """Hash password with salt."""
-        return hashlib.sha256(password.encode()).hexdigest()
-    
-    def register(
+        """Hash password with argon2id (salt is embedded in the hash)."""
+        return _password_hasher.hash(password)
+
+    def _verify_password(self, stored_hash: str, password: str) -> bool:
+        """
+        Check a password against its stored hash.
+
+        Accepts argon2 hashes and legacy unsalted SHA-256 hex digests.
+        """
+        if stored_hash.startswith(_ARGON2_PREFIX):
+            try:
+                return _password_hasher.verify(stored_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+
+        legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(stored_hash, legacy_hash)
+
+    def _needs_rehash(self, stored_hash: str) -> bool:
+        """True for legacy SHA-256 hashes or argon2 hashes with outdated parameters."""
+        if not stored_hash.startswith(_ARGON2_PREFIX):
+            return True
+        return _password_hasher.check_needs_rehash(stored_hash)
+
+    async def register(
         self,
         name: str,
         email: str,
         password: str,
-    ) -> Optional[dict]:
+    ) -> dict | None:
         """
         Register a new user.
-        
+
+        Expects an already-normalized email (see RegisterRequest).
         Returns user dict or None if email exists.
         """
         logger.info(f"Registering new user: {email}")
-        
-        # Check if email exists
-        if self.collection.find_one({"email": email.lower().strip()}):
+
+        # Cheap early exit before hashing; the unique email index is what
+        # actually settles concurrent registrations
+        if await self.collection.find_one({"email": email}):
             logger.warning(f"Email already exists: {email}")
             return None
-        
-        now = datetime.now(timezone.utc)
+
+        now = datetime.now(UTC)
         user_id = secrets.token_hex(12)
-        
+
         user_doc = {
             "_id": user_id,
             "user_id": user_id,
             "name": name.strip(),
-            "email": email.lower().strip(),
-            "password": self._hash_password(password),
+            "email": email,
+            "password": await asyncio.to_thread(self._hash_password, password),
             "created_at": now,
             "updated_at": now,
         }
-        
-        self.collection.insert_one(user_doc)
+
+        try:
+            await self.collection.insert_one(user_doc)
+        except DuplicateKeyError:
+            logger.warning(f"Email already exists: {email}")
+            return None
         logger.info(f"User registered: {user_id}")
-        
+
         return {
             "user_id": user_id,
             "name": name,
-            "email": email.lower().strip(),
+            "email": email,
         }
-    
-    def login(self, email: str, password: str) -> Optional[str]:
+
+    async def login(self, email: str, password: str) -> str | None:
         """
         Login user and return session token.
-        
+
+        Expects an already-normalized email (see LoginRequest).
         Returns session token or None if invalid credentials.
         """
         logger.info(f"Login attempt for: {email}")
-        user = self.collection.find_one({"email": email.lower().strip()})
-        
+        user = await self.collection.find_one({"email": email})
+
         if not user:
             logger.warning(f"Login failed - user not found: {email}")
             return None
-        
-        if user.get("password") != self._hash_password(password):
+
+        stored_hash = user.get("password") or ""
+        # argon2 is CPU-bound by design; keep it off the event loop
+        if not await asyncio.to_thread(self._verify_password, stored_hash, password):
             logger.warning(f"Login failed - wrong password: {email}")
             return None
-        
-        # Create session token
-        token = secrets.token_urlsafe(32)
+
+        if self._needs_rehash(stored_hash):
+            # Migrate legacy hashes now that we have the plaintext
+            await self.collection.update_one(
+                {"user_id": user["user_id"]},
+                {
+                    "$set": {
+                        "password": await asyncio.to_thread(self._hash_password, password),
+                        "updated_at": datetime.now(UTC),
+                    }
+                },
+            )
+            logger.info(f"Password hash upgraded for: {email}")
+
+        # Create session token (only its hash is persisted)
+        token = secrets.token_urlsafe(TOKEN_BYTES)
         logger.info(f"Login successful: {email}")
-        expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-        
-        self.sessions_collection.insert_one({
-            "token": token,
-            "user_id": user["user_id"],
-            "created_at": datetime.now(timezone.utc),
-            "expires_at": expires_at,
-        })
-        
+        expires_at = datetime.now(UTC) + timedelta(days=7)
+
+        await self.sessions_collection.insert_one(
+            {
+                "token_hash": _hash_token(token),
+                "user_id": user["user_id"],
+                "created_at": datetime.now(UTC),
+                "expires_at": expires_at,
+            }
+        )
+
         return token
-    
-    def get_user_by_token(self, token: str) -> Optional[UsersModel]:
-        """Get user from session token."""
-        session = self.sessions_collection.find_one({
-            "token": token,
-            "expires_at": {"$gt": datetime.now(timezone.utc)}
-        })
-        
-        if not session:
-            return None
-        
-        user = self.collection.find_one({"user_id": session["user_id"]})
-        
-        if not user:
+
+    async def get_user_by_token(self, token: str) -> UsersModel | None:
+        """
+        Get user from session token.
+
+        Hits are served from an in-process cache for up to TOKEN_CACHE_TTL
+        seconds; logout evicts the token immediately.
+        """
+        cached = _token_cache.get(token)
+        if cached is not None:
+            valid_until, cached_user = cached
+            if time.monotonic() < valid_until:
+                return cached_user
+            _token_cache.pop(token, None)
+
+        # Resolve token and user in one round trip
+        cursor = await self.sessions_collection.aggregate(
+            [
+                {
+                    "$match": {
+                        "token_hash": _hash_token(token),
+                        "expires_at": {"$gt": datetime.now(UTC)},
+                    }
+                },
+                {"$limit": 1},
+                {
+                    "$lookup": {
+                        "from": self.collection.name,
+                        "localField": "user_id",
+                        "foreignField": "user_id",
+                        "pipeline": [{"$project": _USER_PROJECTION}],
+                        "as": "user",
+                    }
+                },
+                {"$unwind": "$user"},
+            ]
+        )
+        sessions = await cursor.to_list(1)
+
+        if not sessions:
             return None
-        
-        return UsersModel(
+
+        session = sessions[0]
+        user = session["user"]
+
+        users_model = UsersModel(
             user_id=user["user_id"],
             name=user["name"],
             email=user["email"],
-            created_at=user.get("created_at", datetime.now(timezone.utc)),
-            updated_at=user.get("updated_at", datetime.now(timezone.utc)),
+            created_at=user.get("created_at", datetime.now(UTC)),
+            updated_at=user.get("updated_at", datetime.now(UTC)),
         )
-    
-    def logout(self, token: str) -> bool:
+        _cache_user(token, users_model, session["expires_at"])
+        return users_model
+
+    async def get_user_id_by_token(self, token: str) -> str | None:
+        """
+        Get the user_id for a session token from the session row alone.
+
+        Cheaper than get_user_by_token (no users lookup) for routes that
+        only need the id; shares its in-process cache. The user row is not
+        checked, so a token keeps resolving after its user is removed, until
+        the login session expires or is deleted. get_user_by_token joins the
+        user and returns None in that case.
+        """
+        cached = _token_cache.get(token)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1].user_id
+
+        session = await self.sessions_collection.find_one(
+            {
+                "token_hash": _hash_token(token),
+                "expires_at": {"$gt": datetime.now(UTC)},
+            },
+            projection={"_id": 0, "user_id": 1},
+        )
+        return session["user_id"] if session else None
+
+    async def logout(self, token: str) -> bool:
         """Logout user by deleting session."""
-        result = self.sessions_collection.delete_one({"token": token})
+        _token_cache.pop(token, None)
+        result = await self.sessions_collection.delete_one({"token_hash": _hash_token(token)})
         return result.deleted_count > 0
-    
-    def get_user_by_id(self, user_id: str) -> Optional[dict]:
+
+    async def get_user_by_id(self, user_id: str) -> dict | None:
         """Get user by ID."""
-        user = self.collection.find_one({"user_id": user_id})
-        
+        user = await self.collection.find_one({"user_id": user_id})
+
         if not user:
             return None
-        
+
         return {
             "user_id": user["user_id"],
             "name": user["name"],
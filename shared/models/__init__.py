@@ -1,16 +1,19 @@
 """
 Models package - Pydantic models for data validation.
 """
+
 from shared.models.sessions_model import (
-    SessionsModel,
     SessionCreate,
     SessionResponse,
+    SessionsModel,
 )
-from shared.models.users_model import UsersModel
+from shared.models.users_model import LoginRequest, RegisterRequest, UsersModel
 
 __all__ = [
     "SessionsModel",
-    "SessionCreate", 
+    "SessionCreate",
     "SessionResponse",
     "UsersModel",
+    "LoginRequest",
+    "RegisterRequest",
 ]
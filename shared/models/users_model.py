@@ -1,26 +1,50 @@
 """
 Users Model - Pydantic model for user data.
 """
-from pydantic import BaseModel, EmailStr, field_validator
+
 from datetime import datetime
-from typing import Optional
+
+from pydantic import BaseModel, EmailStr, field_validator
+
+
+def normalize_email(v):
+    """Lowercase and trim an email before EmailStr validation."""
+    if isinstance(v, str):
+        return v.strip().lower()
+    return v
+
+
+class LoginRequest(BaseModel):
+    """Login form payload; the email arrives normalized at the service."""
+
+    email: EmailStr
+    password: str
+
+    _normalize_email = field_validator("email", mode="before")(normalize_email)
+
+
+class RegisterRequest(BaseModel):
+    """Registration form payload; the email arrives normalized at the service."""
+
+    name: str
+    email: EmailStr
+    password: str
+    password_confirm: str
+
+    _normalize_email = field_validator("email", mode="before")(normalize_email)
 
 
 class UsersModel(BaseModel):
     """User model for MongoDB persistence."""
+
     user_id: str
     name: str
     email: EmailStr
-    google_id: Optional[str] = None
-    given_name: Optional[str] = None
-    family_name: Optional[str] = None
-    picture: Optional[str] = None
+    google_id: str | None = None
+    given_name: str | None = None
+    family_name: str | None = None
+    picture: str | None = None
     created_at: datetime
     updated_at: datetime
 
-    @field_validator('email', mode='before')
-    @classmethod
-    def normalize_email(cls, v):
-        if isinstance(v, str):
-            return v.strip().lower()
-        return v
\ No newline at end of file
+    _normalize_email = field_validator("email", mode="before")(normalize_email)
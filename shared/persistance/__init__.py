@@ -1,6 +1,12 @@
 """
 Persistance package - Database connections and repositories.
 """
-from shared.persistance.mongo_db import mongo_pool, get_mongo_client, get_database
 
-__all__ = ["mongo_pool", "get_mongo_client", "get_database"]
+from shared.persistance.mongo_db import (
+    get_async_mongo_client,
+    get_database,
+    get_mongo_client,
+    mongo_pool,
+)
+
+__all__ = ["mongo_pool", "get_mongo_client", "get_async_mongo_client", "get_database"]
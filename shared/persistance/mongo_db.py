@@ -1,75 +1,176 @@
 """
 MongoDB Connection Pool - Singleton pattern for connection reuse.
 """
-from pymongo import MongoClient
-from pymongo.database import Database
+
+import asyncio
+import threading
+from functools import lru_cache
 from typing import Optional
-import os
+
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from config.settings import get_settings
+from shared.services.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _pool_options() -> dict:
+    """Pool options shared by the sync and async clients."""
+    settings = get_settings()
+    return {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "maxConnecting": settings.MONGO_MAX_CONNECTING,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": 5000,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "retryWrites": True,
+        "w": "majority",
+        "readPreference": "primary",
+    }
 
 
 class MongoDBPool:
     """Singleton MongoDB connection pool."""
-    
+
     _instance: Optional["MongoDBPool"] = None
-    _client: Optional[MongoClient] = None
-    
+    _client: MongoClient | None = None
+    _async_client: AsyncMongoClient | None = None
+    _uri: str | None = None
+    # Handles resolved once per name; dropped when the client closes
+    _dbs: dict[str | None, Database]
+    _collections: dict[tuple[str | None, str], Collection]
+    _async_collections: dict[tuple[str | None, str], AsyncCollection]
+    # Guards client creation so racing first callers share one pool
+    _lock = threading.Lock()
+
     def __new__(cls) -> "MongoDBPool":
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance._dbs = {}
+            cls._instance._collections = {}
+            cls._instance._async_collections = {}
         return cls._instance
-    
-    def connect(self, uri: Optional[str] = None) -> MongoClient:
+
+    def connect(self, uri: str | None = None) -> MongoClient:
         """
         Initialize or return existing MongoDB client.
-        Uses connection pooling by default (maxPoolSize=100).
+        Pool sizing and timeouts come from settings (MONGO_*_POOL_SIZE etc.).
+
+        No I/O happens here (the driver connects in the background);
+        call warmup() once at startup to verify the server is reachable.
         """
         if self._client is None:
-            self._client = MongoClient(
-                uri,
-                maxPoolSize=100,
-                minPoolSize=10,
-                maxIdleTimeMS=30000,
-                connectTimeoutMS=5000,
-                serverSelectionTimeoutMS=5000,
-            )
-            # Test connection
-            self._client.admin.command("ping")
+            with self._lock:
+                if self._client is None:
+                    self._uri = uri
+                    options = _pool_options()
+                    self._client = MongoClient(uri, **options)
+                    logger.info(
+                        f"MongoDB pool: maxPoolSize={options['maxPoolSize']} "
+                        f"minPoolSize={options['minPoolSize']} "
+                        f"maxIdleTimeMS={options['maxIdleTimeMS']} "
+                        f"waitQueueTimeoutMS={options['waitQueueTimeoutMS']}"
+                    )
         return self._client
-    
-    def get_database(self, db_name: Optional[str] = None) -> Database:
+
+    async def warmup(self) -> None:
+        """Ping the server once (off the event loop) so startup fails fast."""
+        await asyncio.to_thread(self.client.admin.command, "ping")
+
+    def get_database(self, db_name: str | None = None) -> Database:
         """Get database instance."""
-        if self._client is None:
-            self.connect()
-        return self._client[db_name]
-    
-    def get_collection(self, collection_name: str, db_name: Optional[str] = None):
+        db = self._dbs.get(db_name)
+        if db is None:
+            if self._client is None:
+                self.connect()
+            db = self._dbs[db_name] = self._client[db_name]
+        return db
+
+    def get_collection(self, collection_name: str, db_name: str | None = None) -> Collection:
         """Get collection from database."""
-        db = self.get_database(db_name)
-        return db[collection_name]
-    
+        key = (db_name, collection_name)
+        collection = self._collections.get(key)
+        if collection is None:
+            collection = self._collections[key] = self.get_database(db_name)[collection_name]
+        return collection
+
+    def get_async_collection(
+        self,
+        collection_name: str,
+        db_name: str | None = None,
+    ) -> AsyncCollection:
+        """Get collection from the async client (non-blocking I/O)."""
+        key = (db_name, collection_name)
+        collection = self._async_collections.get(key)
+        if collection is None:
+            collection = self._async_collections[key] = self.async_client[db_name][collection_name]
+        return collection
+
     def close(self) -> None:
         """Close MongoDB connection."""
         if self._client:
             self._client.close()
             self._client = None
-    
+        self._dbs.clear()
+        self._collections.clear()
+        # Drop handles resolved by the cached dependencies below
+        get_mongo_client.cache_clear()
+        get_database.cache_clear()
+
+    async def aclose(self) -> None:
+        """Close both async and sync MongoDB connections."""
+        if self._async_client:
+            await self._async_client.close()
+            self._async_client = None
+        self._async_collections.clear()
+        self.close()
+
     @property
-    def client(self) -> Optional[MongoClient]:
+    def client(self) -> MongoClient | None:
         """Get raw client (connects if needed)."""
         if self._client is None:
             self.connect()
         return self._client
 
+    @property
+    def async_client(self) -> AsyncMongoClient:
+        """
+        Get async client for use from async handlers.
+
+        Created lazily (no I/O on construction) with the same URI and
+        pool options as the sync client.
+        """
+        if self._async_client is None:
+            if self._client is None:
+                self.connect()
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncMongoClient(self._uri, **_pool_options())
+        return self._async_client
+
 
 # Global singleton instance
 mongo_pool = MongoDBPool()
 
 
+@lru_cache(maxsize=1)
 def get_mongo_client() -> MongoClient:
-    """FastAPI dependency: get MongoDB client."""
+    """FastAPI dependency: get MongoDB client (resolved once until close())."""
     return mongo_pool.client
 
 
-def get_database(db_name: Optional[str] = None) -> Database:
-    """FastAPI dependency: get database."""
+@lru_cache(maxsize=8)
+def get_database(db_name: str | None = None) -> Database:
+    """FastAPI dependency: get database (resolved once per name until close())."""
     return mongo_pool.get_database(db_name)
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """FastAPI dependency: get async MongoDB client."""
+    return mongo_pool.async_client
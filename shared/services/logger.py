@@ -1,42 +1,192 @@
 """
 Logger Service - Centralized logging configuration.
 """
+
+import atexit
 import logging
+import os
+import queue
 import sys
-from typing import Optional
+import threading
+import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+# Records reach stdout in batches: once this many are buffered,
+# on any ERROR, or every LOG_FLUSH_INTERVAL seconds
+LOG_BUFFER_CAPACITY = 512
+LOG_FLUSH_INTERVAL = 1.0
+
+# Background thread that owns the stdout handler (see setup_logging)
+_listener: QueueListener | None = None
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that renders each wall-clock second only once per thread.
+
+    Records logged within the same second reuse the cached timestamp
+    string instead of calling time.strftime again.
+    """
+
+    def __init__(self, fmt: str = LOG_FORMAT, datefmt: str = LOG_DATEFMT):
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self._local = threading.local()
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        second = int(record.created)
+        local = self._local
+        if getattr(local, "second", None) != second:
+            local.second = second
+            local.text = time.strftime(datefmt or self.datefmt, self.converter(second))
+        return local.text
+
+
+class BatchingHandler(MemoryHandler):
+    """
+    MemoryHandler that writes its whole buffer to the target in one write.
+
+    A daemon thread also flushes every `interval` seconds so records
+    aren't held back while logging is quiet.
+    """
+
+    def __init__(
+        self,
+        target: logging.StreamHandler,
+        capacity: int = LOG_BUFFER_CAPACITY,
+        interval: float = LOG_FLUSH_INTERVAL,
+    ):
+        super().__init__(capacity, flushLevel=logging.ERROR, target=target, flushOnClose=True)
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically,
+            args=(interval,),
+            name="log-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+
+    def _flush_periodically(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            target = self.target
+            if not self.buffer or target is None:
+                return
+
+            # Reported by handleError if the batched write itself fails
+            first_record = self.buffer[0]
+            lines = []
+            for record in self.buffer:
+                if record.levelno < target.level or not target.filter(record):
+                    continue
+                try:
+                    lines.append(target.format(record) + target.terminator)
+                except Exception:
+                    target.handleError(record)
+            self.buffer.clear()
+            if not lines:
+                return
+
+            with target.lock:
+                try:
+                    target.stream.write("".join(lines))
+                    target.stream.flush()
+                except Exception:
+                    target.handleError(first_record)
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._flusher is not threading.current_thread():
+            self._flusher.join()
+        super().close()
 
 
 # Configure root logger
 def setup_logging(level: int = logging.INFO) -> None:
-    """Setup root logging configuration."""
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-        ]
-    )
+    """
+    Setup root logging configuration.
 
+    The root logger only enqueues records; a QueueListener thread formats
+    them and writes them to stdout in batches, keeping I/O off the event
+    loop and cutting write syscalls.
 
-def get_logger(name: str, level: Optional[int] = None) -> logging.Logger:
+    Idempotent: a no-op once logging is configured, by this function or
+    by the host application, so repeated calls never stack handlers.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    if _listener is not None or root.handlers:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(CachedTimeFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, BatchingHandler(handler), respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def shutdown_logging() -> None:
+    """
+    Drain queued and buffered records and stop the logging threads.
+
+    Records logged afterwards are written directly to stdout. Safe to
+    call more than once.
+    """
+    global _listener
+
+    if _listener is None:
+        return
+
+    listener, _listener = _listener, None
+    listener.stop()
+
+    direct_handlers = []
+    for handler in listener.handlers:
+        if isinstance(handler, BatchingHandler):
+            direct_handlers.append(handler.target)
+            handler.close()
+        else:
+            direct_handlers.append(handler)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+            root.removeHandler(handler)
+            for target in direct_handlers:
+                root.addHandler(target)
+
+
+def get_logger(name: str, level: int | None = None) -> logging.Logger:
     """
     Get a logger instance with the given name.
-    
+
     Args:
         name: Logger name (usually __name__ or module path)
         level: Optional log level override
-        
+
     Returns:
         Configured logger instance
     """
     logger = logging.getLogger(name)
-    
+
     if level is not None:
         logger.setLevel(level)
-    
+
     return logger
 
 
-# Setup logging on module import
-setup_logging()
+# Setup logging on module import, except under pytest (tests opt in by
+# calling setup_logging and pytest captures log records itself)
+if not (os.environ.get("PYTEST_VERSION") or os.environ.get("PYTEST_CURRENT_TEST")):
+    setup_logging()
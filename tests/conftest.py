@@ -1,32 +1,137 @@
+import hashlib
 import os
-import pytest
-from datetime import datetime, timezone
-from unittest.mock import MagicMock, AsyncMock, patch
-from typing import Generator, AsyncGenerator
 import secrets
+from collections.abc import Mapping
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType, SimpleNamespace
+from typing import Any
+from unittest.mock import DEFAULT, AsyncMock, MagicMock, Mock, patch
+
+import pytest
 
 os.environ.setdefault("OPENAI_API_KEY", "test-key")
 os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
 os.environ.setdefault("MONGO_DB", "test_db")
 
-from fastapi.testclient import TestClient
-from httpx import AsyncClient, ASGITransport
+from pymongo.results import DeleteResult
 
+from config.settings import Settings
+from shared.models.sessions_model import SessionCreate, SessionsModel
 from shared.models.users_model import UsersModel
-from shared.models.sessions_model import SessionsModel, SessionCreate, SessionResponse
+
+
+def _reset_async_collection(collection: MagicMock, methods: dict[str, Any]) -> MagicMock:
+    """
+    Restore a shared async collection double to its default behaviour.
+
+    Args:
+        collection: Session-scoped collection mock
+        methods: AsyncMock method name -> return value (DEFAULT for a plain mock)
+
+    Returns:
+        The same collection, with call history and configuration cleared
+    """
+    collection.reset_mock(return_value=True, side_effect=True)
+    for name, return_value in methods.items():
+        # Tests may have swapped the method for their own mock
+        if not isinstance(getattr(collection, name), AsyncMock):
+            setattr(collection, name, AsyncMock())
+        getattr(collection, name).return_value = return_value
+    return collection
+
+
+# Collection doubles are built once per session and reset before each test
+# that requests them, instead of rebuilding the MagicMock graph every time
+@pytest.fixture(scope="session")
+def shared_async_collection() -> MagicMock:
+    return MagicMock()
+
+
+@pytest.fixture
+def mock_async_collection(shared_async_collection: MagicMock) -> MagicMock:
+    collection = _reset_async_collection(
+        shared_async_collection,
+        {
+            "find_one": None,
+            "insert_one": DEFAULT,
+            "insert_many": DEFAULT,
+            "find_one_and_update": None,
+            "update_one": DEFAULT,
+            "bulk_write": DEFAULT,
+            "delete_one": DeleteResult({"n": 0}, acknowledged=True),
+            "create_index": DEFAULT,
+        },
+    )
+    if not isinstance(collection.find, MagicMock):
+        collection.find = MagicMock()
+    collection.find.return_value = EMPTY_CURSOR
+    return collection
+
+
+_SESSIONS_COLLECTION_METHODS = (
+    "find_one",
+    "insert_one",
+    "delete_one",
+    "delete_many",
+    "create_index",
+    "drop_index",
+    "aggregate",
+    "find",
+    "bulk_write",
+)
+
+
+@pytest.fixture(scope="session")
+def shared_sessions_collection() -> Mock:
+    # spec'd Mock: no eager dunder children, and typos raise AttributeError
+    return Mock(spec=_SESSIONS_COLLECTION_METHODS)
 
 
 @pytest.fixture
-def mock_mongo_collection() -> MagicMock:
-    collection = MagicMock()
-    collection.find_one = MagicMock(return_value=None)
-    collection.insert_one = MagicMock()
-    collection.find = MagicMock(return_value=iter([]))
-    collection.find_one_and_update = MagicMock(return_value=None)
-    collection.delete_one = MagicMock(return_value=MagicMock(deleted_count=0))
+def mock_sessions_collection(shared_sessions_collection: Mock) -> Mock:
+    """Auth sessions collection double (token_hash -> user_id)."""
+    collection = _reset_async_collection(
+        shared_sessions_collection,
+        {
+            "find_one": None,
+            "insert_one": DEFAULT,
+            "delete_one": DeleteResult({"n": 0}, acknowledged=True),
+            "delete_many": DEFAULT,
+            "create_index": DEFAULT,
+            "drop_index": DEFAULT,
+            "aggregate": MagicMock(to_list=AsyncMock(return_value=[])),
+            "bulk_write": DEFAULT,
+        },
+    )
+    if not isinstance(collection.find, MagicMock):
+        collection.find = MagicMock()
+    collection.find.return_value = EMPTY_CURSOR
     return collection
 
 
+@pytest.fixture(scope="session")
+def shared_auth_service(shared_async_collection: MagicMock, shared_sessions_collection: Mock):
+    # Imported here: modules.web pulls in the routers and, with them, langchain,
+    # which would otherwise load for every test module at collection time
+    from modules.web.services.auth_service import AuthService
+
+    service = AuthService(collection=shared_async_collection)
+    service._sessions_collection = shared_sessions_collection
+    return service
+
+
+@pytest.fixture
+def auth_service(
+    shared_auth_service,
+    mock_async_collection: MagicMock,
+    mock_sessions_collection: Mock,
+):
+    # Requesting the collection fixtures resets the mocks the service holds
+    return shared_auth_service
+
+
 @pytest.fixture
 def mock_mongo_client() -> MagicMock:
     client = MagicMock()
@@ -34,9 +139,11 @@ def mock_mongo_client() -> MagicMock:
     return client
 
 
-@pytest.fixture
+# Read-only models/values are built once per session; sample_session_doc is
+# frozen, the user/auth *_doc dicts are fresh copies per test
+@pytest.fixture(scope="session")
 def sample_user() -> UsersModel:
-    now = datetime.now(timezone.utc)
+    now = datetime.now(UTC)
     return UsersModel(
         user_id="user_123",
         name="Test User",
@@ -46,8 +153,9 @@ def sample_user() -> UsersModel:
     )
 
 
-@pytest.fixture
-def sample_user_doc(sample_user: UsersModel) -> dict:
+@pytest.fixture(scope="session")
+def sample_user_document(sample_user: UsersModel) -> dict:
+    """Stored user document built once; read-only, use sample_user_doc to mutate."""
     return {
         "_id": sample_user.user_id,
         "user_id": sample_user.user_id,
@@ -60,8 +168,13 @@ def sample_user_doc(sample_user: UsersModel) -> dict:
 
 
 @pytest.fixture
+def sample_user_doc(sample_user_document: dict) -> dict:
+    return dict(sample_user_document)
+
+
+@pytest.fixture(scope="session")
 def sample_session() -> SessionsModel:
-    now = datetime.now(timezone.utc)
+    now = datetime.now(UTC)
     session_id = "session_456"
     return SessionsModel(
         session_id=session_id,
@@ -73,12 +186,19 @@ def sample_session() -> SessionsModel:
     )
 
 
-@pytest.fixture
-def sample_session_doc(sample_session: SessionsModel) -> dict:
-    return sample_session.to_document()
+@pytest.fixture(scope="session")
+def sample_session_doc(sample_session: SessionsModel) -> Mapping[str, Any]:
+    """to_document() output built once and frozen; copy with dict(...) to change it."""
+    return MappingProxyType(sample_session.to_document())
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def single_session_find(sample_session_doc: Mapping[str, Any]):
+    """find() stand-in over [sample_session_doc], built once per session."""
+    return create_mock_find([sample_session_doc])
+
+
+@pytest.fixture(scope="session")
 def sample_session_create() -> SessionCreate:
     return SessionCreate(user_id="user_123", name="New Session")
 
@@ -87,67 +207,165 @@ def sample_session_create() -> SessionCreate:
 def mock_checkpointer() -> MagicMock:
     checkpointer = MagicMock()
     checkpointer.get_tuple = MagicMock(return_value=None)
+    checkpointer.aget_tuple = AsyncMock(return_value=None)
     checkpointer.put = MagicMock()
     return checkpointer
 
 
-@pytest.fixture
+MOCK_OPENAI_RESPONSE = "This is a test response from the AI."
+
+
+def _chat_stream_event(text: str) -> dict:
+    return {"event": "on_chat_model_stream", "data": {"chunk": SimpleNamespace(content=text)}}
+
+
+# Split once at import; every mocked stream replays the same events
+MOCK_STREAM_TOKENS = tuple(f"{word} " for word in MOCK_OPENAI_RESPONSE.split())
+MOCK_STREAM_EVENTS = tuple(_chat_stream_event(token) for token in MOCK_STREAM_TOKENS)
+
+
+async def mock_stream(*args, **kwargs):
+    """astream_events stand-in yielding one event per token."""
+    for event in MOCK_STREAM_EVENTS:
+        yield event
+
+
+async def batched_stream(*args, **kwargs):
+    """astream_events stand-in yielding the whole response as one chunk."""
+    yield _chat_stream_event("".join(MOCK_STREAM_TOKENS))
+
+
+@pytest.fixture(scope="session")
 def mock_openai_response() -> str:
-    return "This is a test response from the AI."
+    return MOCK_OPENAI_RESPONSE
 
 
 @pytest.fixture
 def mock_conversation_agent(mock_checkpointer: MagicMock, mock_openai_response: str):
-    with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-        with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-            mock_agent = MagicMock()
+    with (
+        patch("modules.langchain.agents.conversation_agent.ChatOpenAI"),
+        patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create,
+    ):
+        mock_agent = MagicMock()
 
-            async def mock_stream(*args, **kwargs):
-                for chunk in mock_openai_response.split():
-                    yield chunk + " "
+        # astream_events is iterated, not awaited; side_effect hands
+        # each call a fresh generator
+        mock_agent.astream_events = MagicMock(side_effect=mock_stream)
+        mock_agent.ainvoke = AsyncMock(
+            return_value={"messages": [MagicMock(content=mock_openai_response)]}
+        )
+        mock_create.return_value = mock_agent
 
-            mock_agent.astream_events = AsyncMock(return_value=mock_stream())
-            mock_agent.ainvoke = AsyncMock(return_value={
-                "messages": [MagicMock(content=mock_openai_response)]
-            })
-            mock_create.return_value = mock_agent
+        from modules.langchain.agents.conversation_agent import ConversationAgent
 
-            from modules.langchain.agents.conversation_agent import ConversationAgent
-            agent = ConversationAgent(mock_checkpointer)
-            yield agent
+        agent = ConversationAgent(mock_checkpointer)
+        yield agent
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def auth_token() -> str:
     return secrets.token_urlsafe(32)
 
 
-@pytest.fixture
-def auth_session_doc(auth_token: str, sample_user: UsersModel) -> dict:
-    now = datetime.now(timezone.utc)
-    from datetime import timedelta
+@pytest.fixture(scope="session")
+def auth_session_document(auth_token: str, sample_user: UsersModel) -> dict:
+    """Stored auth session for auth_token built once; read-only, use auth_session_doc to mutate."""
+    now = datetime.now(UTC)
     return {
-        "token": auth_token,
+        "token_hash": hashlib.sha256(auth_token.encode()).digest(),
         "user_id": sample_user.user_id,
         "created_at": now,
         "expires_at": now + timedelta(days=7),
     }
 
 
+@pytest.fixture
+def auth_session_doc(auth_session_document: dict) -> dict:
+    return dict(auth_session_document)
+
+
 class MockCursor:
-    def __init__(self, data: list):
+    """Lazy cursor stand-in: sort/skip/limit are applied only when iterated."""
+
+    def __init__(self, data: list, sort_cache: dict | None = None):
         self._data = data
-        self._sorted = False
+        self._sort = None
+        self._skip = 0
+        self._limit = None
+        # Sorted copies keyed by (field, direction), shared across cursors
+        # handed out by the same create_mock_find
+        self._sort_cache = {} if sort_cache is None else sort_cache
 
     def sort(self, field: str, direction: int):
-        self._sorted = True
+        self._sort = (field, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        # Like pymongo, limit(0) means no limit
+        self._limit = count or None
         return self
 
+    def _ordered(self) -> list:
+        if self._sort is None:
+            return self._data
+        rows = self._sort_cache.get(self._sort)
+        if rows is None:
+            field, direction = self._sort
+            # Missing fields sort lowest, as BSON null does
+            rows = self._sort_cache[self._sort] = sorted(
+                self._data,
+                key=lambda doc: (field in doc, doc.get(field)),
+                reverse=direction < 0,
+            )
+        return rows
+
     def __iter__(self):
-        return iter(self._data)
+        stop = None if self._limit is None else self._skip + self._limit
+        return islice(self._ordered(), self._skip, stop)
+
+    async def __aiter__(self):
+        for doc in self:
+            yield doc
+
+
+# Shared safely: sort/skip/limit state on an empty cursor never changes results
+EMPTY_CURSOR = MockCursor([])
 
 
 def create_mock_find(data: list):
+    sort_cache: dict = {}
+
     def mock_find(*args, **kwargs):
-        return MockCursor(data)
+        return MockCursor(data, sort_cache)
+
     return mock_find
+
+
+@lru_cache(maxsize=32)
+def settings_for(env_items: tuple[tuple[str, str], ...]) -> Settings:
+    """
+    Settings parsed with env_items applied on top of os.environ.
+
+    Cached per env, separately from get_settings(); callers share the
+    returned instance, so treat it as read-only.
+
+    Args:
+        env_items: Sorted (name, value) pairs, e.g. tuple(sorted(env.items()))
+
+    Returns:
+        Settings instance for that environment
+    """
+    saved = {key: os.environ.get(key) for key, _ in env_items}
+    os.environ.update(env_items)
+    try:
+        return Settings()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
@@ -1,14 +1,74 @@
+import asyncio
 import os
+import sys
+from collections.abc import AsyncGenerator, Generator
+from datetime import UTC, datetime, timedelta
+
+import bson
 import pytest
-from typing import Generator
+import pytest_asyncio
+from pymongo import AsyncMongoClient, MongoClient
 from testcontainers.mongodb import MongoDbContainer
-from pymongo import MongoClient
+
+from modules.langchain.services.session_service import SessionService
+from modules.web.services.auth_service import AuthService
 
 os.environ.setdefault("OPENAI_API_KEY", "test-key-integration")
 
+# Container started by the xdist controller and shared by all workers
+_shared_container: MongoDbContainer | None = None
+
+
+def _test_mongo_uri() -> str | None:
+    # Point at an already-running MongoDB (CI service, local dev) to skip the container
+    return os.environ.get("TEST_MONGO_URI")
+
+
+def pytest_configure(config):
+    """
+    Under pytest-xdist, start one container in the controller process.
+
+    Workers are spawned after this hook and inherit TEST_MONGO_URI, so
+    they connect to the shared container instead of starting their own.
+    """
+    global _shared_container
+
+    is_worker = hasattr(config, "workerinput")
+    if is_worker or not getattr(config.option, "numprocesses", None) or _test_mongo_uri():
+        return
+
+    _shared_container = MongoDbContainer("mongo:7.0")
+    _shared_container.start()
+    os.environ["TEST_MONGO_URI"] = _shared_container.get_connection_url()
+
+
+def pytest_unconfigure(config):
+    global _shared_container
+
+    if _shared_container is not None:
+        os.environ.pop("TEST_MONGO_URI", None)
+        _shared_container.stop()
+        _shared_container = None
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    # uvloop (pulled in by uvicorn[standard]) has no Windows build
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
 
 @pytest.fixture(scope="session")
-def mongodb_container() -> Generator[MongoDbContainer, None, None]:
+def mongodb_container() -> Generator[MongoDbContainer | None, None, None]:
+    if _test_mongo_uri():
+        yield None
+        return
     container = MongoDbContainer("mongo:7.0")
     container.start()
     yield container
@@ -16,25 +76,116 @@ def mongodb_container() -> Generator[MongoDbContainer, None, None]:
 
 
 @pytest.fixture(scope="session")
-def mongodb_uri(mongodb_container: MongoDbContainer) -> str:
+def mongodb_uri(mongodb_container: MongoDbContainer | None) -> str:
+    if mongodb_container is None:
+        return _test_mongo_uri()
     return mongodb_container.get_connection_url()
 
 
+# Enough connections for the concurrent (asyncio.gather) tests without
+# opening more sockets than a worker can use
+TEST_POOL_OPTIONS = {"maxPoolSize": min((os.cpu_count() or 1) * 2, 32)}
+
+
 @pytest.fixture(scope="session")
 def mongodb_client(mongodb_uri: str) -> Generator[MongoClient, None, None]:
-    client = MongoClient(mongodb_uri)
+    # A pure-Python BSON fallback would silently slow every test down
+    assert bson.has_c(), "pymongo's bson C extension is not available"
+    client = MongoClient(mongodb_uri, connect=False, **TEST_POOL_OPTIONS)
     yield client
     client.close()
 
 
-@pytest.fixture
-def test_database(mongodb_client: MongoClient):
-    db_name = "test_llm_service"
-    db = mongodb_client[db_name]
-    yield db
+@pytest.fixture(scope="module")
+def module_database(mongodb_client: MongoClient):
+    # One database per xdist worker ("master" when running without xdist)
+    db_name = f"test_llm_service_{os.environ.get('PYTEST_XDIST_WORKER', 'master')}"
+    yield mongodb_client[db_name]
     mongodb_client.drop_database(db_name)
 
 
+@pytest.fixture
+def test_database(module_database):
+    yield module_database
+    # Empty collections instead of dropping the database per test;
+    # indexes survive and the drop happens once per module
+    for name in module_database.list_collection_names():
+        module_database[name].delete_many({})
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def async_mongodb_client(mongodb_uri: str) -> AsyncGenerator[AsyncMongoClient, None]:
+    # One pool (and handshake) for the whole run; needs async tests on the
+    # session loop, see pytestmark in the test modules
+    client = AsyncMongoClient(mongodb_uri, **TEST_POOL_OPTIONS)
+    yield client
+    await client.close()
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="session")
+async def app_indexes(async_mongodb_client: AsyncMongoClient, module_database) -> None:
+    # Same indexes as startup; they survive the per-test delete_many and
+    # go away with the per-module database drop
+    db = async_mongodb_client[module_database.name]
+    await SessionService(collection=db["user_sessions"]).ensure_indexes()
+    auth_service = AuthService(collection=db["users"])
+    auth_service._sessions_collection = db["auth_sessions"]
+    await auth_service.ensure_indexes()
+
+
+@pytest.fixture
+def async_test_database(async_mongodb_client: AsyncMongoClient, test_database, app_indexes):
+    return async_mongodb_client[test_database.name]
+
+
+@pytest.fixture
+def async_sessions_collection(async_test_database):
+    return async_test_database["user_sessions"]
+
+
+@pytest.fixture
+def seed_sessions(async_sessions_collection):
+    """
+    Insert n session documents for a user in one insert_many.
+
+    Documents are built raw (no model validation); each is a minute newer
+    than the last. Use this when a test only needs sessions to exist.
+    """
+
+    async def seed(user_id: str, n: int = 1) -> list[dict]:
+        base = datetime(2024, 1, 1, tzinfo=UTC)
+        docs = []
+        for i in range(n):
+            session_id = f"{user_id}_{i}"
+            timestamp = base + timedelta(minutes=i)
+            docs.append(
+                {
+                    "_id": session_id,
+                    "session_id": session_id,
+                    "thread_id": session_id,
+                    "user_id": user_id,
+                    "name": f"Session {i}",
+                    "created_at": timestamp,
+                    "updated_at": timestamp,
+                }
+            )
+        # insert_many adds nothing to the dicts: _id is already set
+        await async_sessions_collection.insert_many(docs, ordered=False)
+        return docs
+
+    return seed
+
+
+@pytest.fixture
+def async_users_collection(async_test_database):
+    return async_test_database["users"]
+
+
+@pytest.fixture
+def async_auth_sessions_collection(async_test_database):
+    return async_test_database["auth_sessions"]
+
+
 @pytest.fixture
 def users_collection(test_database):
     return test_database["users"]
@@ -57,11 +208,9 @@ def checkpoints_collection(test_database):
 
 @pytest.fixture
 def integration_settings(mongodb_uri: str, test_database):
-    from config import settings as settings_module
     from config.settings import get_settings
 
     get_settings.cache_clear()
-    original_get_settings = settings_module.get_settings
 
     class TestSettings:
         MONGO_URI = mongodb_uri
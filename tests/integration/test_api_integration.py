@@ -1,19 +1,37 @@
+from collections.abc import AsyncGenerator
+from contextlib import contextmanager
+
+import orjson
 import pytest
-from unittest.mock import MagicMock, AsyncMock
-from httpx import AsyncClient, ASGITransport
+import pytest_asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-
+from fastapi.responses import ORJSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from modules.langchain.http_handlers.conversation import (
+    get_conversation_agent,
+    get_session_service,
+)
+from modules.langchain.http_handlers.conversation import (
+    router as conversation_router,
+)
 from modules.langchain.services.session_service import SessionService
 from shared.models.sessions_model import SessionCreate
 
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.slow,
+    # Share the session loop so the session-scoped async Mongo client can be reused
+    pytest.mark.asyncio(loop_scope="session"),
+]
 
-pytestmark = [pytest.mark.integration, pytest.mark.slow]
 
-
-@pytest.fixture
+# Routes are static, so one app serves the whole run
+@pytest.fixture(scope="session")
 def test_app():
-    app = FastAPI(title="Test LLM Service")
+    # Same response class as main.py
+    app = FastAPI(title="Test LLM Service", default_response_class=ORJSONResponse)
 
     app.add_middleware(
         CORSMiddleware,
@@ -23,8 +41,10 @@ def test_app():
         allow_headers=["*"],
     )
 
-    from modules.langchain.http_handlers.conversation import router as conversation_router
     app.include_router(conversation_router)
+    # get_conversation_agent reads the agent built at startup from app.state;
+    # tests that reach the agent override the dependency instead
+    app.state.agent = None
 
     @app.get("/health")
     async def health():
@@ -33,236 +53,171 @@ def test_app():
     return app
 
 
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def api_client(test_app: FastAPI) -> AsyncGenerator[AsyncClient, None]:
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url="http://test") as client:
+        yield client
+
+
+# Validated once at import; bulk_create builds fresh documents from them
+_SEED_SESSIONS = tuple(SessionCreate(user_id="list_user", name=f"Session {i}") for i in range(3))
+
+
+class _StubAgent:
+    """Minimal ConversationAgent stand-in for the non-streaming path."""
+
+    async def invoke(self, message: str, thread_id: str) -> str:
+        return "AI Response"
+
+
+@contextmanager
+def overrides(app: FastAPI, values: dict):
+    """Make each dependency return the given value for the duration of one test."""
+    app.dependency_overrides.update(
+        {dependency: (lambda value=value: value) for dependency, value in values.items()}
+    )
+    try:
+        yield
+    finally:
+        app.dependency_overrides.clear()
+
+
 class TestHealthEndpoint:
-    @pytest.mark.asyncio
-    async def test_health_check(self, test_app: FastAPI):
-        transport = ASGITransport(app=test_app)
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            response = await client.get("/health")
-            assert response.status_code == 200
-            assert response.json()["status"] == "healthy"
+    async def test_health_check(self, api_client: AsyncClient):
+        response = await api_client.get("/health")
+        assert response.status_code == 200
+        assert orjson.loads(response.content)["status"] == "healthy"
+
+
+class TestErrorResponses:
+    @pytest.mark.parametrize(
+        ("method", "path", "json", "expected_status"),
+        [
+            ("GET", "/conversation/session/nonexistent", None, 404),
+            ("DELETE", "/conversation/session/nonexistent", None, 404),
+            (
+                "POST",
+                "/conversation",
+                {"user_id": "test_user", "message": "   ", "stream": False},
+                400,
+            ),
+            ("POST", "/conversation", {"user_id": "   ", "message": "Hello", "stream": False}, 400),
+            (
+                "POST",
+                "/conversation",
+                {
+                    "session_id": "nonexistent",
+                    "user_id": "test_user",
+                    "message": "Hello",
+                    "stream": False,
+                },
+                404,
+            ),
+        ],
+        ids=[
+            "get_session_not_found",
+            "delete_session_not_found",
+            "conversation_empty_message",
+            "conversation_empty_user_id",
+            "conversation_session_not_found",
+        ],
+    )
+    async def test_error_cases(
+        self,
+        test_app: FastAPI,
+        api_client: AsyncClient,
+        async_sessions_collection,
+        method: str,
+        path: str,
+        json: dict,
+        expected_status: int,
+    ):
+        service = SessionService(collection=async_sessions_collection)
+
+        with overrides(test_app, {get_session_service: service}):
+            response = await api_client.request(method, path, json=json)
+
+        assert response.status_code == expected_status
 
 
 class TestSessionEndpoints:
-    @pytest.mark.asyncio
-    async def test_create_session(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.post(
-                    "/conversation/session",
-                    json={"user_id": "test_user", "name": "API Test Session"}
-                )
-
-                assert response.status_code == 200
-                data = response.json()
-                assert data["user_id"] == "test_user"
-                assert data["name"] == "API Test Session"
-                assert "session_id" in data
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_create_session_missing_user_id(self, test_app: FastAPI):
-        transport = ASGITransport(app=test_app)
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            response = await client.post(
-                "/conversation/session",
-                json={"name": "No User Session"}
-            )
-            assert response.status_code == 422
-
-    @pytest.mark.asyncio
-    async def test_get_session(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        created = service.create_session(
-            SessionCreate(user_id="test_user", name="Get Test")
-        )
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.get(f"/conversation/session/{created.session_id}")
-
-                assert response.status_code == 200
-                data = response.json()
-                assert data["session_id"] == created.session_id
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_get_session_not_found(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.get("/conversation/session/nonexistent")
-                assert response.status_code == 404
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_list_user_sessions(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        for i in range(3):
-            service.create_session(
-                SessionCreate(user_id="list_user", name=f"Session {i}")
+    async def test_create_session(
+        self, test_app: FastAPI, api_client: AsyncClient, async_sessions_collection
+    ):
+        service = SessionService(collection=async_sessions_collection)
+
+        with overrides(test_app, {get_session_service: service}):
+            response = await api_client.post(
+                "/conversation/session", json={"user_id": "test_user", "name": "API Test Session"}
             )
 
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.get("/conversation/sessions/user/list_user")
+            assert response.status_code == 200
+            data = orjson.loads(response.content)
+            assert data["user_id"] == "test_user"
+            assert data["name"] == "API Test Session"
+            assert "session_id" in data
+
+    async def test_create_session_missing_user_id(self, api_client: AsyncClient):
+        response = await api_client.post("/conversation/session", json={"name": "No User Session"})
+        assert response.status_code == 422
+
+    async def test_get_session(
+        self, test_app: FastAPI, api_client: AsyncClient, async_sessions_collection
+    ):
+        service = SessionService(collection=async_sessions_collection)
+
+        created = await service.create_session(SessionCreate(user_id="test_user", name="Get Test"))
 
-                assert response.status_code == 200
-                data = response.json()
-                assert len(data["sessions"]) == 3
-        finally:
-            test_app.dependency_overrides.clear()
+        with overrides(test_app, {get_session_service: service}):
+            response = await api_client.get(f"/conversation/session/{created.session_id}")
 
-    @pytest.mark.asyncio
-    async def test_delete_session(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
+            assert response.status_code == 200
+            data = orjson.loads(response.content)
+            assert data["session_id"] == created.session_id
+
+    async def test_list_user_sessions(
+        self, test_app: FastAPI, api_client: AsyncClient, async_sessions_collection
+    ):
+        service = SessionService(collection=async_sessions_collection)
 
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
+        await service.bulk_create(list(_SEED_SESSIONS))
 
-        created = service.create_session(
-            SessionCreate(user_id="test_user", name="To Delete")
-        )
+        with overrides(test_app, {get_session_service: service}):
+            response = await api_client.get("/conversation/sessions/user/list_user")
 
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.delete(f"/conversation/session/{created.session_id}")
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            sessions = [orjson.loads(line) for line in response.content.splitlines()]
+            assert len(sessions) == 3
 
-                assert response.status_code == 200
-                assert service.get_session(created.session_id) is None
-        finally:
-            test_app.dependency_overrides.clear()
+    async def test_delete_session(
+        self, test_app: FastAPI, api_client: AsyncClient, async_sessions_collection
+    ):
+        service = SessionService(collection=async_sessions_collection)
 
-    @pytest.mark.asyncio
-    async def test_delete_session_not_found(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
+        created = await service.create_session(SessionCreate(user_id="test_user", name="To Delete"))
 
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
+        with overrides(test_app, {get_session_service: service}):
+            response = await api_client.delete(f"/conversation/session/{created.session_id}")
 
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.delete("/conversation/session/nonexistent")
-                assert response.status_code == 404
-        finally:
-            test_app.dependency_overrides.clear()
+            assert response.status_code == 200
+            assert await service.get_session(created.session_id) is None
 
 
 class TestConversationEndpoint:
-    @pytest.mark.asyncio
-    async def test_conversation_empty_message(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.post(
-                    "/conversation",
-                    json={"user_id": "test_user", "message": "   ", "stream": False}
-                )
-                assert response.status_code == 400
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_conversation_empty_user_id(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.post(
-                    "/conversation",
-                    json={"user_id": "   ", "message": "Hello", "stream": False}
-                )
-                assert response.status_code == 400
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_conversation_session_not_found(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import get_session_service
-
-        service = SessionService(collection=sessions_collection)
-        test_app.dependency_overrides[get_session_service] = lambda: service
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.post(
-                    "/conversation",
-                    json={
-                        "session_id": "nonexistent",
-                        "user_id": "test_user",
-                        "message": "Hello",
-                        "stream": False
-                    }
-                )
-                assert response.status_code == 404
-        finally:
-            test_app.dependency_overrides.clear()
-
-    @pytest.mark.asyncio
-    async def test_conversation_non_streaming(self, test_app: FastAPI, sessions_collection):
-        from modules.langchain.http_handlers.conversation import (
-            get_session_service,
-            get_conversation_agent,
-        )
-
-        service = SessionService(collection=sessions_collection)
-        mock_agent = MagicMock()
-        mock_agent.invoke = AsyncMock(return_value="AI Response")
-
-        test_app.dependency_overrides[get_session_service] = lambda: service
-        test_app.dependency_overrides[get_conversation_agent] = lambda: mock_agent
-
-        try:
-            transport = ASGITransport(app=test_app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                response = await client.post(
-                    "/conversation",
-                    json={
-                        "user_id": "test_user",
-                        "message": "Hello AI",
-                        "stream": False
-                    }
-                )
-
-                assert response.status_code == 200
-                data = response.json()
-                assert data["response"] == "AI Response"
-                assert "session_id" in data
-        finally:
-            test_app.dependency_overrides.clear()
+    async def test_conversation_non_streaming(
+        self, test_app: FastAPI, api_client: AsyncClient, async_sessions_collection
+    ):
+        service = SessionService(collection=async_sessions_collection)
+        with overrides(
+            test_app, {get_session_service: service, get_conversation_agent: _StubAgent()}
+        ):
+            response = await api_client.post(
+                "/conversation",
+                json={"user_id": "test_user", "message": "Hello AI", "stream": False},
+            )
+
+            assert response.status_code == 200
+            data = orjson.loads(response.content)
+            assert data["response"] == "AI Response"
+            assert "session_id" in data
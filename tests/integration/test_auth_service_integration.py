@@ -1,26 +1,79 @@
-import pytest
-from datetime import datetime, timezone, timedelta
+import asyncio
 import hashlib
+import secrets
+from datetime import UTC, datetime, timedelta
+
+import pytest
 
 from modules.web.services.auth_service import AuthService
-from shared.models.users_model import UsersModel
+from shared.models.users_model import LoginRequest, RegisterRequest, UsersModel
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.slow,
+    # Share the session loop so the session-scoped async Mongo client can be reused
+    pytest.mark.asyncio(loop_scope="session"),
+]
 
+# Password of every user created by the register_user fixture
+TEST_PASSWORD = "password"
+_PASSWORD_HASH_CACHE_KEY = "llm_service/test_password_hash"
 
-pytestmark = [pytest.mark.integration, pytest.mark.slow]
+# Pre-argon2 stored format: unsalted SHA-256 hex digest of "plain_password"
+_PLAIN_PW_SHA256 = "eeca5bf838b955c7911461822d9cf34aa386240dc24c592e44d4e17e91e35915"
 
 
 class TestAuthServiceIntegration:
     @pytest.fixture
-    def auth_service(self, users_collection, auth_sessions_collection) -> AuthService:
-        service = AuthService(collection=users_collection)
-        service._sessions_collection = auth_sessions_collection
+    def auth_service(self, async_users_collection, async_auth_sessions_collection) -> AuthService:
+        service = AuthService(collection=async_users_collection)
+        service._sessions_collection = async_auth_sessions_collection
         return service
 
-    def test_register_new_user(self, auth_service: AuthService):
-        result = auth_service.register(
-            name="Integration User",
-            email="integration@example.com",
-            password="secure_password123"
+    @pytest.fixture(scope="class")
+    def test_password_hash(self, request: pytest.FixtureRequest) -> str:
+        # argon2 hashing dominates register(); pay for it once per class and
+        # keep it in pytest's cache (.pytest_cache) across runs
+        service = AuthService()
+        cache = getattr(request.config, "cache", None)
+        cached = cache.get(_PASSWORD_HASH_CACHE_KEY, None) if cache is not None else None
+        if (
+            cached
+            and cached.get("password") == TEST_PASSWORD
+            and not service._needs_rehash(cached["hash"])
+        ):
+            return cached["hash"]
+
+        password_hash = service._hash_password(TEST_PASSWORD)
+        if cache is not None:
+            cache.set(_PASSWORD_HASH_CACHE_KEY, {"password": TEST_PASSWORD, "hash": password_hash})
+        return password_hash
+
+    @pytest.fixture
+    def register_user(self, async_users_collection, test_password_hash: str):
+        """Insert a user with TEST_PASSWORD directly, skipping register()'s hashing."""
+
+        async def register(name: str, email: str) -> dict:
+            now = datetime.now(UTC)
+            user_id = secrets.token_hex(12)
+            await async_users_collection.insert_one(
+                {
+                    "_id": user_id,
+                    "user_id": user_id,
+                    "name": name,
+                    "email": email,
+                    "password": test_password_hash,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            return {"user_id": user_id, "name": name, "email": email}
+
+        return register
+
+    async def test_register_new_user(self, auth_service: AuthService):
+        result = await auth_service.register(
+            name="Integration User", email="integration@example.com", password="secure_password123"
         )
 
         assert result is not None
@@ -28,130 +81,226 @@ class TestAuthServiceIntegration:
         assert result["email"] == "integration@example.com"
         assert "user_id" in result
 
-    def test_register_duplicate_email(self, auth_service: AuthService):
-        auth_service.register("User One", "duplicate@example.com", "password1")
+    async def test_register_duplicate_email(self, auth_service: AuthService):
+        await auth_service.register("User One", "duplicate@example.com", "password1")
 
-        result = auth_service.register("User Two", "duplicate@example.com", "password2")
+        result = await auth_service.register("User Two", "duplicate@example.com", "password2")
 
         assert result is None
 
-    def test_register_normalizes_email(self, auth_service: AuthService):
-        result = auth_service.register(
+    async def test_concurrent_register_same_email(
+        self, auth_service: AuthService, async_users_collection
+    ):
+        results = await asyncio.gather(
+            auth_service.register("User One", "race@example.com", "password1"),
+            auth_service.register("User Two", "race@example.com", "password2"),
+        )
+
+        assert sum(result is not None for result in results) == 1
+        assert await async_users_collection.count_documents({"email": "race@example.com"}) == 1
+
+    async def test_register_normalizes_email(self, auth_service: AuthService):
+        form = RegisterRequest(
             name="Test User",
             email="  TEST@EXAMPLE.COM  ",
-            password="password"
+            password="password",
+            password_confirm="password",
         )
+        result = await auth_service.register(form.name, form.email, form.password)
 
         assert result["email"] == "test@example.com"
 
-    def test_login_success(self, auth_service: AuthService):
-        auth_service.register("Login User", "login@example.com", "correct_password")
+    async def test_login_success(self, auth_service: AuthService, register_user):
+        await register_user("Login User", "login@example.com")
 
-        token = auth_service.login("login@example.com", "correct_password")
+        token = await auth_service.login("login@example.com", TEST_PASSWORD)
 
         assert token is not None
         assert isinstance(token, str)
         assert len(token) > 20
 
-    def test_login_wrong_password(self, auth_service: AuthService):
-        auth_service.register("Wrong Pass User", "wrong@example.com", "correct_password")
+    async def test_login_wrong_password(self, auth_service: AuthService, register_user):
+        await register_user("Wrong Pass User", "wrong@example.com")
 
-        token = auth_service.login("wrong@example.com", "wrong_password")
+        token = await auth_service.login("wrong@example.com", "wrong_password")
 
         assert token is None
 
-    def test_login_nonexistent_user(self, auth_service: AuthService):
-        token = auth_service.login("nonexistent@example.com", "password")
+    async def test_login_nonexistent_user(self, auth_service: AuthService):
+        token = await auth_service.login("nonexistent@example.com", "password")
 
         assert token is None
 
-    def test_login_email_case_insensitive(self, auth_service: AuthService):
-        auth_service.register("Case User", "case@example.com", "password")
+    async def test_login_email_case_insensitive(self, auth_service: AuthService, register_user):
+        await register_user("Case User", "case@example.com")
 
-        token = auth_service.login("CASE@EXAMPLE.COM", "password")
+        form = LoginRequest(email="CASE@EXAMPLE.COM", password=TEST_PASSWORD)
+        token = await auth_service.login(form.email, form.password)
 
         assert token is not None
 
-    def test_get_user_by_token(self, auth_service: AuthService):
-        auth_service.register("Token User", "token@example.com", "password")
-        token = auth_service.login("token@example.com", "password")
+    async def test_get_user_by_token(self, auth_service: AuthService, register_user):
+        await register_user("Token User", "token@example.com")
+        token = await auth_service.login("token@example.com", TEST_PASSWORD)
 
-        user = auth_service.get_user_by_token(token)
+        user = await auth_service.get_user_by_token(token)
 
         assert user is not None
         assert isinstance(user, UsersModel)
         assert user.email == "token@example.com"
 
-    def test_get_user_by_invalid_token(self, auth_service: AuthService):
-        user = auth_service.get_user_by_token("invalid_token_12345")
+    async def test_get_user_id_by_token(self, auth_service: AuthService, register_user):
+        registered = await register_user("Id Token User", "idtoken@example.com")
+        token = await auth_service.login("idtoken@example.com", TEST_PASSWORD)
+
+        assert await auth_service.get_user_id_by_token(token) == registered["user_id"]
+        assert await auth_service.get_user_id_by_token("invalid_token_12345") is None
+
+    async def test_get_user_by_invalid_token(self, auth_service: AuthService):
+        user = await auth_service.get_user_by_token("invalid_token_12345")
 
         assert user is None
 
-    def test_get_user_by_expired_token(self, auth_service: AuthService, auth_sessions_collection):
-        auth_service.register("Expired User", "expired@example.com", "password")
-        token = auth_service.login("expired@example.com", "password")
+    async def test_get_user_by_expired_token(
+        self, auth_service: AuthService, auth_sessions_collection, register_user
+    ):
+        await register_user("Expired User", "expired@example.com")
+        token = await auth_service.login("expired@example.com", TEST_PASSWORD)
 
         auth_sessions_collection.update_one(
-            {"token": token},
-            {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(hours=1)}}
+            {"token_hash": hashlib.sha256(token.encode()).digest()},
+            {"$set": {"expires_at": datetime.now(UTC) - timedelta(hours=1)}},
         )
 
-        user = auth_service.get_user_by_token(token)
+        user = await auth_service.get_user_by_token(token)
+
+        assert user is None
+
+    async def test_get_user_by_token_deleted_user(
+        self, auth_service: AuthService, users_collection, register_user
+    ):
+        await register_user("Gone User", "gone@example.com")
+        token = await auth_service.login("gone@example.com", TEST_PASSWORD)
+        users_collection.delete_one({"email": "gone@example.com"})
+
+        user = await auth_service.get_user_by_token(token)
 
         assert user is None
 
-    def test_logout(self, auth_service: AuthService):
-        auth_service.register("Logout User", "logout@example.com", "password")
-        token = auth_service.login("logout@example.com", "password")
+    async def test_get_user_id_by_token_ignores_deleted_user(
+        self, auth_service: AuthService, users_collection, register_user
+    ):
+        registered = await register_user("Orphan User", "orphan@example.com")
+        token = await auth_service.login("orphan@example.com", TEST_PASSWORD)
+        users_collection.delete_one({"email": "orphan@example.com"})
+
+        # Documented: only the session row is read, so the id still resolves
+        assert await auth_service.get_user_id_by_token(token) == registered["user_id"]
+        assert await auth_service.get_user_by_token(token) is None
 
-        result = auth_service.logout(token)
-        user_after_logout = auth_service.get_user_by_token(token)
+    async def test_logout(self, auth_service: AuthService, register_user):
+        await register_user("Logout User", "logout@example.com")
+        token = await auth_service.login("logout@example.com", TEST_PASSWORD)
+
+        result = await auth_service.logout(token)
+        user_after_logout = await auth_service.get_user_by_token(token)
 
         assert result is True
         assert user_after_logout is None
 
-    def test_logout_invalid_token(self, auth_service: AuthService):
-        result = auth_service.logout("invalid_token")
+    async def test_logout_invalid_token(self, auth_service: AuthService):
+        result = await auth_service.logout("invalid_token")
 
         assert result is False
 
-    def test_get_user_by_id(self, auth_service: AuthService):
-        registered = auth_service.register("ID User", "id@example.com", "password")
+    async def test_get_user_by_id(self, auth_service: AuthService, register_user):
+        registered = await register_user("ID User", "id@example.com")
 
-        user = auth_service.get_user_by_id(registered["user_id"])
+        user = await auth_service.get_user_by_id(registered["user_id"])
 
         assert user is not None
         assert user["email"] == "id@example.com"
 
-    def test_get_user_by_id_not_found(self, auth_service: AuthService):
-        user = auth_service.get_user_by_id("nonexistent_user_id")
+    async def test_get_user_by_id_not_found(self, auth_service: AuthService):
+        user = await auth_service.get_user_by_id("nonexistent_user_id")
 
         assert user is None
 
-    def test_multiple_sessions_same_user(self, auth_service: AuthService):
-        auth_service.register("Multi Session", "multi@example.com", "password")
+    async def test_multiple_sessions_same_user(self, auth_service: AuthService, register_user):
+        await register_user("Multi Session", "multi@example.com")
 
-        token1 = auth_service.login("multi@example.com", "password")
-        token2 = auth_service.login("multi@example.com", "password")
+        token1, token2 = await asyncio.gather(
+            auth_service.login("multi@example.com", TEST_PASSWORD),
+            auth_service.login("multi@example.com", TEST_PASSWORD),
+        )
 
         assert token1 != token2
-        assert auth_service.get_user_by_token(token1) is not None
-        assert auth_service.get_user_by_token(token2) is not None
+        users = await asyncio.gather(
+            auth_service.get_user_by_token(token1),
+            auth_service.get_user_by_token(token2),
+        )
+        assert all(user is not None for user in users)
 
-    def test_logout_one_session_keeps_other(self, auth_service: AuthService):
-        auth_service.register("Keep Session", "keep@example.com", "password")
-        token1 = auth_service.login("keep@example.com", "password")
-        token2 = auth_service.login("keep@example.com", "password")
+    async def test_logout_one_session_keeps_other(self, auth_service: AuthService, register_user):
+        await register_user("Keep Session", "keep@example.com")
+        token1, token2 = await asyncio.gather(
+            auth_service.login("keep@example.com", TEST_PASSWORD),
+            auth_service.login("keep@example.com", TEST_PASSWORD),
+        )
 
-        auth_service.logout(token1)
+        await auth_service.logout(token1)
 
-        assert auth_service.get_user_by_token(token1) is None
-        assert auth_service.get_user_by_token(token2) is not None
+        logged_out, kept = await asyncio.gather(
+            auth_service.get_user_by_token(token1),
+            auth_service.get_user_by_token(token2),
+        )
+        assert logged_out is None
+        assert kept is not None
 
-    def test_password_hashing(self, auth_service: AuthService, users_collection):
-        auth_service.register("Hash User", "hash@example.com", "plain_password")
+    async def test_password_hashing(self, auth_service: AuthService, users_collection):
+        await auth_service.register("Hash User", "hash@example.com", "plain_password")
 
         user_doc = users_collection.find_one({"email": "hash@example.com"})
 
-        assert user_doc["password"] != "plain_password"
-        assert user_doc["password"] == hashlib.sha256(b"plain_password").hexdigest()
+        assert user_doc["password"] not in ("plain_password", _PLAIN_PW_SHA256)
+        assert user_doc["password"].startswith("$argon2id$")
+
+    async def test_legacy_password_upgraded_on_login(
+        self, auth_service: AuthService, users_collection
+    ):
+        await auth_service.register("Legacy User", "legacy@example.com", "plain_password")
+        users_collection.update_one(
+            {"email": "legacy@example.com"},
+            {"$set": {"password": _PLAIN_PW_SHA256}},
+        )
+
+        assert await auth_service.login("legacy@example.com", "plain_password") is not None
+
+        user_doc = users_collection.find_one({"email": "legacy@example.com"})
+        assert user_doc["password"].startswith("$argon2id$")
+
+    async def test_legacy_plaintext_token_migrated_and_still_valid(
+        self,
+        auth_service: AuthService,
+        async_auth_sessions_collection,
+        register_user,
+    ):
+        registered = await register_user("Legacy Token", "legacytoken@example.com")
+        now = datetime.now(UTC)
+        await async_auth_sessions_collection.insert_one(
+            {
+                "token": "legacy_plain_token",
+                "user_id": registered["user_id"],
+                "created_at": now,
+                "expires_at": now + timedelta(days=1),
+            }
+        )
+
+        assert await auth_service.migrate_legacy_tokens() == 1
+        assert await auth_service.migrate_legacy_tokens() == 0
+
+        stored = await async_auth_sessions_collection.find_one({"user_id": registered["user_id"]})
+        assert "token" not in stored
+        user = await auth_service.get_user_by_token("legacy_plain_token")
+        assert user is not None
+        assert user.email == "legacytoken@example.com"
@@ -1,12 +1,29 @@
-import pytest
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 
+import pytest
 from pymongo import MongoClient
-
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
 
 pytestmark = [pytest.mark.integration, pytest.mark.slow]
 
 
+# Indexes are built once per module; test_database only empties the
+# documents between tests, so they stay in place
+@pytest.fixture(scope="module")
+def indexed_collection(module_database) -> Collection:
+    collection = module_database["indexed_collection"]
+    collection.create_index("email", unique=True)
+    return collection
+
+
+@pytest.fixture(scope="module")
+def text_search_collection(module_database) -> Collection:
+    collection = module_database["text_search_test"]
+    collection.create_index([("content", "text")])
+    return collection
+
+
 class TestMongoDBConnection:
     def test_connection_established(self, mongodb_client: MongoClient):
         result = mongodb_client.admin.command("ping")
@@ -44,15 +61,11 @@ class TestMongoDBConnection:
         assert col1.find_one()["data"] == "col1"
         assert col2.find_one()["data"] == "col2"
 
-    def test_index_creation(self, test_database):
-        collection = test_database["indexed_collection"]
-
-        collection.create_index("email", unique=True)
+    def test_index_creation(self, test_database, indexed_collection: Collection):
+        indexed_collection.insert_one({"email": "test@example.com"})
 
-        collection.insert_one({"email": "test@example.com"})
-
-        with pytest.raises(Exception):
-            collection.insert_one({"email": "test@example.com"})
+        with pytest.raises(DuplicateKeyError):
+            indexed_collection.insert_one({"email": "test@example.com"})
 
     def test_query_with_filters(self, test_database):
         collection = test_database["query_test"]
@@ -76,8 +89,8 @@ class TestMongoDBConnection:
     def test_sorting_and_limiting(self, test_database):
         collection = test_database["sort_test"]
 
-        for i in range(10):
-            collection.insert_one({"order": i, "created_at": datetime.now(timezone.utc)})
+        now = datetime.now(UTC)
+        collection.insert_many([{"order": i, "created_at": now} for i in range(10)])
 
         ascending = list(collection.find().sort("order", 1).limit(3))
         assert [d["order"] for d in ascending] == [0, 1, 2]
@@ -91,9 +104,7 @@ class TestMongoDBConnection:
         collection.insert_one({"counter": 0, "name": "test"})
 
         updated = collection.find_one_and_update(
-            {"name": "test"},
-            {"$inc": {"counter": 1}},
-            return_document=True
+            {"name": "test"}, {"$inc": {"counter": 1}}, return_document=True
         )
 
         assert updated["counter"] == 1
@@ -110,7 +121,7 @@ class TestMongoDBConnection:
 
         pipeline = [
             {"$group": {"_id": "$category", "total": {"$sum": "$value"}}},
-            {"$sort": {"_id": 1}}
+            {"$sort": {"_id": 1}},
         ]
         results = list(collection.aggregate(pipeline))
 
@@ -123,7 +134,7 @@ class TestMongoDBConnection:
     def test_datetime_handling(self, test_database):
         collection = test_database["datetime_test"]
 
-        now = datetime.now(timezone.utc)
+        now = datetime.now(UTC)
         collection.insert_one({"timestamp": now, "event": "test"})
 
         retrieved = collection.find_one({"event": "test"})
@@ -139,10 +150,8 @@ class TestMongoDBConnection:
         assert len(result.inserted_ids) == 100
         assert collection.count_documents({}) == 100
 
-    def test_text_search(self, test_database):
-        collection = test_database["text_search_test"]
-
-        collection.create_index([("content", "text")])
+    def test_text_search(self, test_database, text_search_collection: Collection):
+        collection = text_search_collection
 
         docs = [
             {"content": "Python is a great programming language"},
@@ -1,207 +1,366 @@
-import pytest
-from datetime import datetime, timezone, timedelta
-from unittest.mock import MagicMock, patch
 import hashlib
+from unittest.mock import MagicMock, Mock
 
-from shared.models.users_model import UsersModel
-from modules.web.services.auth_service import AuthService
+import pytest
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import DeleteResult
 
+from modules.web.services.auth_service import AuthService
+from shared.models.users_model import UsersModel
+from tests.conftest import MockCursor
 
 pytestmark = pytest.mark.unit
 
+# Legacy (pre-argon2) stored password digests, computed once at import
+_SHA256_CORRECT = hashlib.sha256(b"correct_password").hexdigest()
+_SHA256_TEST = hashlib.sha256(b"test_password").hexdigest()
+
 
 class TestAuthService:
-    @pytest.fixture
-    def mock_sessions_collection(self) -> MagicMock:
-        collection = MagicMock()
-        collection.find_one = MagicMock(return_value=None)
-        collection.insert_one = MagicMock()
-        collection.delete_one = MagicMock(return_value=MagicMock(deleted_count=0))
-        return collection
-
-    @pytest.fixture
-    def auth_service(
-        self,
-        mock_mongo_collection: MagicMock,
-        mock_sessions_collection: MagicMock,
-    ) -> AuthService:
-        service = AuthService(collection=mock_mongo_collection)
-        service._sessions_collection = mock_sessions_collection
-        return service
+    @pytest.fixture(autouse=True)
+    def clear_token_cache(self):
+        from modules.web.services import auth_service
+
+        auth_service._token_cache.clear()
+        yield
+        auth_service._token_cache.clear()
+
+    @staticmethod
+    def set_token_lookup(collection: MagicMock, docs: list[dict]) -> None:
+        collection.aggregate.return_value.to_list.return_value = docs
+
+    async def test_ensure_indexes(
+        self,
+        auth_service: AuthService,
+        mock_async_collection: MagicMock,
+        mock_sessions_collection: Mock,
+    ):
+        await auth_service.ensure_indexes()
+
+        user_indexes = [c.args[0] for c in mock_async_collection.create_index.await_args_list]
+        assert user_indexes == ["email", "user_id"]
+        mock_sessions_collection.create_index.assert_any_await("token_hash", unique=True)
+        mock_sessions_collection.delete_many.assert_not_awaited()
+        mock_sessions_collection.drop_index.assert_awaited_once_with("token_1")
+        mock_sessions_collection.create_index.assert_any_await("expires_at", expireAfterSeconds=0)
+
+    async def test_migrate_legacy_tokens(
+        self,
+        auth_service: AuthService,
+        mock_sessions_collection: Mock,
+    ):
+        mock_sessions_collection.find.return_value = MockCursor(
+            [{"_id": "s1", "token": "legacy_token"}]
+        )
+
+        migrated = await auth_service.migrate_legacy_tokens()
+
+        assert migrated == 1
+        assert mock_sessions_collection.find.call_args.args[0] == {"token": {"$exists": True}}
+        (operation,) = mock_sessions_collection.bulk_write.await_args.args[0]
+        assert operation._filter == {"_id": "s1"}
+        assert operation._doc == {
+            "$set": {"token_hash": Binary(hashlib.sha256(b"legacy_token").digest())},
+            "$unset": {"token": ""},
+        }
+        mock_sessions_collection.delete_many.assert_not_awaited()
+
+    async def test_migrate_legacy_tokens_nothing_to_do(
+        self,
+        auth_service: AuthService,
+        mock_sessions_collection: Mock,
+    ):
+        assert await auth_service.migrate_legacy_tokens() == 0
+        mock_sessions_collection.bulk_write.assert_not_awaited()
 
     def test_hash_password(self, auth_service: AuthService):
         password = "test_password"
         hashed = auth_service._hash_password(password)
 
-        expected = hashlib.sha256(password.encode()).hexdigest()
-        assert hashed == expected
-
-    def test_register_success(
+        assert hashed.startswith("$argon2id$")
+        assert hashed != auth_service._hash_password(password)
+        assert auth_service._verify_password(hashed, password)
+        assert not auth_service._verify_password(hashed, "other_password")
+
+    def test_verify_legacy_sha256_password(self, auth_service: AuthService):
+        assert auth_service._verify_password(_SHA256_TEST, "test_password")
+        assert not auth_service._verify_password(_SHA256_TEST, "other_password")
+
+    @pytest.mark.parametrize(
+        ("email", "email_taken", "registered"),
+        [
+            ("john@example.com", False, True),
+            ("test@example.com", True, False),
+        ],
+        ids=["success", "email_already_exists"],
+    )
+    async def test_register(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_user_document: dict,
+        email: str,
+        email_taken: bool,
+        registered: bool,
     ):
-        mock_mongo_collection.find_one.return_value = None
+        mock_async_collection.find_one.return_value = sample_user_document if email_taken else None
 
-        result = auth_service.register("John Doe", "john@example.com", "password123")
+        result = await auth_service.register("John Doe", email, "password123")
 
-        assert result is not None
-        assert result["name"] == "John Doe"
-        assert result["email"] == "john@example.com"
-        assert "user_id" in result
-        mock_mongo_collection.insert_one.assert_called_once()
+        if registered:
+            assert result["name"] == "John Doe"
+            assert result["email"] == email
+            assert "user_id" in result
+        else:
+            assert result is None
+        assert mock_async_collection.insert_one.await_count == int(registered)
 
-    def test_register_email_already_exists(
+    async def test_register_loses_race_on_unique_email(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        sample_user_doc: dict,
+        mock_async_collection: MagicMock,
     ):
-        mock_mongo_collection.find_one.return_value = sample_user_doc
+        # Both requests passed the find_one check; the unique index rejects the second
+        mock_async_collection.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key")
 
-        result = auth_service.register("John Doe", "test@example.com", "password123")
+        result = await auth_service.register("John Doe", "john@example.com", "password123")
 
         assert result is None
-        mock_mongo_collection.insert_one.assert_not_called()
+        mock_async_collection.insert_one.assert_awaited_once()
+
+    @pytest.mark.parametrize(
+        ("email", "password", "user_exists", "logged_in"),
+        [
+            ("test@example.com", "correct_password", True, True),
+            ("nonexistent@example.com", "password", False, False),
+            ("test@example.com", "wrong_password", True, False),
+        ],
+        ids=["success", "user_not_found", "wrong_password"],
+    )
+    async def test_login(
+        self,
+        auth_service: AuthService,
+        mock_async_collection: MagicMock,
+        mock_sessions_collection: Mock,
+        sample_user_doc: dict,
+        email: str,
+        password: str,
+        user_exists: bool,
+        logged_in: bool,
+    ):
+        sample_user_doc["password"] = _SHA256_CORRECT
+        mock_async_collection.find_one.return_value = sample_user_doc if user_exists else None
+
+        result = await auth_service.login(email, password)
 
-    def test_register_normalizes_email(
+        if logged_in:
+            assert isinstance(result, str)
+        else:
+            assert result is None
+        assert mock_sessions_collection.insert_one.await_count == int(logged_in)
+
+    async def test_login_migrates_legacy_hash(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_user_doc: dict,
     ):
-        mock_mongo_collection.find_one.return_value = None
+        password = "correct_password"
+        sample_user_doc["password"] = _SHA256_CORRECT
+        mock_async_collection.find_one.return_value = sample_user_doc
 
-        result = auth_service.register("John", "  JOHN@EXAMPLE.COM  ", "password")
+        await auth_service.login("test@example.com", password)
 
-        assert result["email"] == "john@example.com"
+        update = mock_async_collection.update_one.await_args.args[1]["$set"]
+        assert auth_service._verify_password(update["password"], password)
+        assert update["password"].startswith("$argon2id$")
 
-    def test_login_success(
+    async def test_login_argon2_hash_not_rewritten(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        mock_sessions_collection: MagicMock,
+        mock_async_collection: MagicMock,
         sample_user_doc: dict,
     ):
         password = "correct_password"
-        sample_user_doc["password"] = hashlib.sha256(password.encode()).hexdigest()
-        mock_mongo_collection.find_one.return_value = sample_user_doc
+        sample_user_doc["password"] = auth_service._hash_password(password)
+        mock_async_collection.find_one.return_value = sample_user_doc
 
-        result = auth_service.login("test@example.com", password)
+        result = await auth_service.login("test@example.com", password)
 
         assert result is not None
-        assert isinstance(result, str)
-        mock_sessions_collection.insert_one.assert_called_once()
+        mock_async_collection.update_one.assert_not_awaited()
 
-    def test_login_user_not_found(
+    async def test_get_user_by_token_success(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
+        mock_sessions_collection: Mock,
+        sample_user_document: dict,
+        auth_session_document: dict,
+        auth_token: str,
     ):
-        mock_mongo_collection.find_one.return_value = None
+        self.set_token_lookup(
+            mock_sessions_collection, [{**auth_session_document, "user": sample_user_document}]
+        )
 
-        result = auth_service.login("nonexistent@example.com", "password")
+        result = await auth_service.get_user_by_token(auth_token)
 
-        assert result is None
-
-    def test_login_wrong_password(
+        assert result is not None
+        assert isinstance(result, UsersModel)
+        assert result.user_id == sample_user_document["user_id"]
+        pipeline = mock_sessions_collection.aggregate.await_args.args[0]
+        assert pipeline[0]["$match"]["token_hash"] == Binary(auth_session_document["token_hash"])
+        lookup = next(stage["$lookup"] for stage in pipeline if "$lookup" in stage)
+        assert lookup["pipeline"] == [
+            {
+                "$project": {
+                    "_id": 0,
+                    "user_id": 1,
+                    "name": 1,
+                    "email": 1,
+                    "created_at": 1,
+                    "updated_at": 1,
+                }
+            }
+        ]
+
+    async def test_get_user_by_token_cached(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        sample_user_doc: dict,
+        mock_sessions_collection: Mock,
+        sample_user_document: dict,
+        auth_session_document: dict,
+        auth_token: str,
     ):
-        sample_user_doc["password"] = hashlib.sha256(b"correct_password").hexdigest()
-        mock_mongo_collection.find_one.return_value = sample_user_doc
+        self.set_token_lookup(
+            mock_sessions_collection, [{**auth_session_document, "user": sample_user_document}]
+        )
 
-        result = auth_service.login("test@example.com", "wrong_password")
+        first = await auth_service.get_user_by_token(auth_token)
+        second = await auth_service.get_user_by_token(auth_token)
 
-        assert result is None
+        assert first is second
+        mock_sessions_collection.aggregate.assert_awaited_once()
 
-    def test_get_user_by_token_success(
+    async def test_logout_evicts_cached_token(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        mock_sessions_collection: MagicMock,
-        sample_user_doc: dict,
-        auth_session_doc: dict,
+        mock_sessions_collection: Mock,
+        sample_user_document: dict,
+        auth_session_document: dict,
+        auth_token: str,
     ):
-        mock_sessions_collection.find_one.return_value = auth_session_doc
-        mock_mongo_collection.find_one.return_value = sample_user_doc
+        self.set_token_lookup(
+            mock_sessions_collection, [{**auth_session_document, "user": sample_user_document}]
+        )
+        await auth_service.get_user_by_token(auth_token)
 
-        result = auth_service.get_user_by_token(auth_session_doc["token"])
+        await auth_service.logout(auth_token)
+        self.set_token_lookup(mock_sessions_collection, [])
 
-        assert result is not None
-        assert isinstance(result, UsersModel)
-        assert result.user_id == sample_user_doc["user_id"]
+        assert await auth_service.get_user_by_token(auth_token) is None
 
-    def test_get_user_by_token_expired_session(
+    async def test_get_user_by_token_expired_or_missing_user(
         self,
         auth_service: AuthService,
-        mock_sessions_collection: MagicMock,
+        mock_sessions_collection: Mock,
     ):
-        mock_sessions_collection.find_one.return_value = None
+        # Expired tokens and tokens whose user is gone both yield no joined row
+        self.set_token_lookup(mock_sessions_collection, [])
 
-        result = auth_service.get_user_by_token("expired_token")
+        result = await auth_service.get_user_by_token("expired_token")
 
         assert result is None
 
-    def test_get_user_by_token_user_not_found(
+    async def test_get_user_id_by_token(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        mock_sessions_collection: MagicMock,
-        auth_session_doc: dict,
+        mock_sessions_collection: Mock,
+        auth_session_document: dict,
+        auth_token: str,
     ):
-        mock_sessions_collection.find_one.return_value = auth_session_doc
-        mock_mongo_collection.find_one.return_value = None
+        mock_sessions_collection.find_one.return_value = {
+            "user_id": auth_session_document["user_id"]
+        }
 
-        result = auth_service.get_user_by_token(auth_session_doc["token"])
+        result = await auth_service.get_user_id_by_token(auth_token)
 
-        assert result is None
+        assert result == auth_session_document["user_id"]
+        query = mock_sessions_collection.find_one.await_args.args[0]
+        assert query["token_hash"] == Binary(auth_session_document["token_hash"])
+        mock_sessions_collection.aggregate.assert_not_awaited()
 
-    def test_logout_success(
+    async def test_get_user_id_by_token_uses_cache(
         self,
         auth_service: AuthService,
-        mock_sessions_collection: MagicMock,
+        mock_sessions_collection: Mock,
+        sample_user_document: dict,
+        auth_session_document: dict,
+        auth_token: str,
     ):
-        mock_sessions_collection.delete_one.return_value = MagicMock(deleted_count=1)
+        self.set_token_lookup(
+            mock_sessions_collection, [{**auth_session_document, "user": sample_user_document}]
+        )
+        await auth_service.get_user_by_token(auth_token)
+
+        result = await auth_service.get_user_id_by_token(auth_token)
 
-        result = auth_service.logout("valid_token")
+        assert result == sample_user_document["user_id"]
+        mock_sessions_collection.find_one.assert_not_awaited()
 
-        assert result is True
-        mock_sessions_collection.delete_one.assert_called_once_with({"token": "valid_token"})
+    async def test_get_user_id_by_token_invalid(
+        self,
+        auth_service: AuthService,
+        mock_sessions_collection: Mock,
+    ):
+        mock_sessions_collection.find_one.return_value = None
+
+        assert await auth_service.get_user_id_by_token("invalid_token") is None
 
-    def test_logout_token_not_found(
+    @pytest.mark.parametrize(
+        ("deleted_count", "logged_out"),
+        [(1, True), (0, False)],
+        ids=["success", "token_not_found"],
+    )
+    async def test_logout(
         self,
         auth_service: AuthService,
-        mock_sessions_collection: MagicMock,
+        mock_sessions_collection: Mock,
+        deleted_count: int,
+        logged_out: bool,
     ):
-        mock_sessions_collection.delete_one.return_value = MagicMock(deleted_count=0)
+        mock_sessions_collection.delete_one.return_value = DeleteResult(
+            {"n": deleted_count}, acknowledged=True
+        )
 
-        result = auth_service.logout("invalid_token")
+        result = await auth_service.logout("valid_token")
 
-        assert result is False
+        assert result is logged_out
+        mock_sessions_collection.delete_one.assert_awaited_once_with(
+            {"token_hash": Binary(hashlib.sha256(b"valid_token").digest())}
+        )
 
-    def test_get_user_by_id_success(
+    async def test_get_user_by_id_success(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
-        sample_user_doc: dict,
+        mock_async_collection: MagicMock,
+        sample_user_document: dict,
     ):
-        mock_mongo_collection.find_one.return_value = sample_user_doc
+        mock_async_collection.find_one.return_value = sample_user_document
 
-        result = auth_service.get_user_by_id("user_123")
+        result = await auth_service.get_user_by_id("user_123")
 
         assert result is not None
         assert result["user_id"] == "user_123"
-        assert result["email"] == sample_user_doc["email"]
+        assert result["email"] == sample_user_document["email"]
 
-    def test_get_user_by_id_not_found(
+    async def test_get_user_by_id_not_found(
         self,
         auth_service: AuthService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
     ):
-        mock_mongo_collection.find_one.return_value = None
+        mock_async_collection.find_one.return_value = None
 
-        result = auth_service.get_user_by_id("nonexistent")
+        result = await auth_service.get_user_by_id("nonexistent")
 
         assert result is None
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+from modules.web.http_handlers import chat
+from modules.web.http_handlers.chat import _sse_frames
+
+pytestmark = pytest.mark.unit
+
+
+async def collect_frames(chunks) -> list[bytes]:
+    return [frame async for frame in _sse_frames(chunks)]
+
+
+def data(frame: bytes) -> dict:
+    return json.loads(frame.split(b"data: ", 1)[1])
+
+
+class TestSseFrames:
+    async def test_emits_chunks_then_done(self):
+        async def stream():
+            yield "Hello "
+            yield "World"
+
+        frames = await collect_frames(stream())
+
+        assert frames == [
+            b"data: Hello \n\n",
+            b"data: World\n\n",
+            b"event: done\ndata: {}\n\n",
+        ]
+
+    async def test_keepalive_does_not_cancel_slow_chunk(self, monkeypatch):
+        monkeypatch.setattr(chat, "SSE_KEEPALIVE_INTERVAL", 0.01)
+
+        async def stream():
+            await asyncio.sleep(0.05)
+            yield "late"
+
+        frames = await collect_frames(stream())
+
+        assert b": keepalive\n\n" in frames
+        assert frames[-2] == b"data: late\n\n"
+        assert frames[-1].startswith(b"event: done\n")
+
+    async def test_no_keepalive_while_tokens_flow(self, monkeypatch):
+        monkeypatch.setattr(chat, "SSE_KEEPALIVE_INTERVAL", 0.05)
+
+        async def stream():
+            for _ in range(10):
+                await asyncio.sleep(0.002)
+                yield "t"
+
+        frames = await collect_frames(stream())
+
+        assert b": keepalive\n\n" not in frames
+
+    async def test_emits_error_frame(self):
+        async def stream():
+            yield "partial"
+            raise RuntimeError("boom")
+
+        frames = await collect_frames(stream())
+
+        assert frames[-1].startswith(b"event: error\n")
+        assert data(frames[-1]) == {"error": "boom"}
+
+    async def test_closing_early_stops_agent_stream(self):
+        closed = False
+
+        async def stream():
+            nonlocal closed
+            try:
+                yield "first"
+                await asyncio.sleep(10)
+                yield "never"
+            finally:
+                closed = True
+
+        frames = _sse_frames(stream())
+        assert await frames.__anext__() == b"data: first\n\n"
+        await frames.aclose()
+
+        assert closed is True
+
+
+class TestTokenFrame:
+    @pytest.mark.parametrize(
+        ("token", "frame"),
+        [
+            (" world", b"data:  world\n\n"),
+            ("ação", "data: ação\n\n".encode()),
+            ("a\nb", b"data: a\ndata: b\n\n"),
+            ("a\r\n\nb", b"data: a\ndata: \ndata: b\n\n"),
+            ('{"chunk": 1}', b'data: {"chunk": 1}\n\n'),
+        ],
+    )
+    def test_frames_raw_token(self, token: str, frame: bytes):
+        assert chat._token_frame(token) == frame
@@ -1,153 +1,256 @@
+import copy
+from collections.abc import Iterator
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
 import pytest
-from unittest.mock import MagicMock, AsyncMock, patch
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 
-from modules.langchain.agents.conversation_agent import ConversationAgent
+from modules.langchain.agents.conversation_agent import ConversationAgent, _get_chat_model
 from modules.langchain.services.checkpointer import CheckpointerFactory, create_checkpointer
-
+from tests.conftest import MOCK_STREAM_TOKENS, batched_stream
 
 pytestmark = pytest.mark.unit
 
 
+def make_event_stream(events: list[dict]):
+    """Return an astream_events stand-in that replays events on every call."""
+
+    async def gen(*args, **kwargs):
+        for event in events:
+            yield event
+
+    return gen
+
+
+_NO_EVENTS = make_event_stream([])
+
+
 class TestConversationAgent:
+    @pytest.fixture(autouse=True)
+    def clear_chat_model_cache(self):
+        _get_chat_model.cache_clear()
+        yield
+        _get_chat_model.cache_clear()
+
+    @pytest.fixture(scope="class")
+    def agent_patches(self) -> Iterator[tuple[MagicMock, MagicMock]]:
+        # Enter the ChatOpenAI/create_agent patches once per class rather
+        # than once per test
+        with ExitStack() as stack:
+            mock_chat = stack.enter_context(
+                patch("modules.langchain.agents.conversation_agent.ChatOpenAI")
+            )
+            mock_create = stack.enter_context(
+                patch("modules.langchain.agents.conversation_agent.create_agent")
+            )
+            yield mock_chat, mock_create
+
+    @pytest.fixture(scope="class")
+    def agent_template(self, agent_patches: tuple[MagicMock, MagicMock]) -> ConversationAgent:
+        return ConversationAgent(MagicMock())
+
+    @pytest.fixture
+    def agent(
+        self, agent_template: ConversationAgent, mock_checkpointer: MagicMock
+    ) -> ConversationAgent:
+        # A deep copy per test keeps one test's mock configuration out of the next
+        agent = copy.deepcopy(agent_template)
+        agent._checkpointer = mock_checkpointer
+        agent._agent.astream_events = MagicMock(side_effect=_NO_EVENTS)
+        agent._agent.ainvoke = AsyncMock(return_value={"messages": []})
+        return agent
+
     @pytest.fixture
-    def agent(self, mock_checkpointer: MagicMock) -> ConversationAgent:
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_agent = MagicMock()
-                mock_create.return_value = mock_agent
-                return ConversationAgent(mock_checkpointer)
+    def fresh_patches(
+        self, agent_patches: tuple[MagicMock, MagicMock]
+    ) -> tuple[MagicMock, MagicMock]:
+        for mock in agent_patches:
+            mock.reset_mock()
+        return agent_patches
+
+    def test_init_creates_agent(
+        self, fresh_patches: tuple[MagicMock, MagicMock], mock_checkpointer: MagicMock
+    ):
+        mock_chat, mock_create = fresh_patches
 
-    def test_init_creates_agent(self, mock_checkpointer: MagicMock):
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI") as mock_chat:
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_create.return_value = MagicMock()
+        ConversationAgent(mock_checkpointer)
 
-                agent = ConversationAgent(mock_checkpointer)
+        mock_chat.assert_called_once()
+        mock_create.assert_called_once()
 
-                mock_chat.assert_called_once()
-                mock_create.assert_called_once()
+    def test_chat_model_shared_between_agents(
+        self, fresh_patches: tuple[MagicMock, MagicMock], mock_checkpointer: MagicMock
+    ):
+        mock_chat, mock_create = fresh_patches
+
+        ConversationAgent(mock_checkpointer)
+        ConversationAgent(mock_checkpointer)
+
+        mock_chat.assert_called_once()
+        assert mock_create.call_args_list[0].args[0] is mock_create.call_args_list[1].args[0]
 
     @pytest.mark.asyncio
-    async def test_stream_yields_chunks(self, mock_checkpointer: MagicMock):
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_agent = MagicMock()
-                mock_chunk = MagicMock()
-                mock_chunk.content = "Hello "
-
-                async def mock_events(*args, **kwargs):
-                    yield {"event": "on_chat_model_stream", "data": {"chunk": mock_chunk}}
-                    mock_chunk.content = "World"
-                    yield {"event": "on_chat_model_stream", "data": {"chunk": mock_chunk}}
-
-                mock_agent.astream_events = mock_events
-                mock_create.return_value = mock_agent
-
-                agent = ConversationAgent(mock_checkpointer)
-                chunks = []
-                async for chunk in agent.stream("test message", "thread_123"):
-                    chunks.append(chunk)
-
-                assert len(chunks) == 2
-                assert "Hello" in chunks[0]
-                assert "World" in chunks[1]
+    async def test_stream_yields_chunks(self, agent: ConversationAgent):
+        agent._agent.astream_events = make_event_stream(
+            [
+                {
+                    "event": "on_chat_model_stream",
+                    "data": {"chunk": SimpleNamespace(content="Hello ")},
+                },
+                {
+                    "event": "on_chat_model_stream",
+                    "data": {"chunk": SimpleNamespace(content="World")},
+                },
+            ]
+        )
+
+        chunks = []
+        async for chunk in agent.stream("test message", "thread_123"):
+            chunks.append(chunk)
+
+        assert len(chunks) == 2
+        assert "Hello" in chunks[0]
+        assert "World" in chunks[1]
 
     @pytest.mark.asyncio
-    async def test_stream_filters_non_stream_events(self, mock_checkpointer: MagicMock):
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_agent = MagicMock()
+    async def test_stream_filters_non_stream_events(self, agent: ConversationAgent):
+        agent._agent.astream_events = make_event_stream(
+            [
+                {"event": "on_tool_start", "data": {}},
+                {"event": "on_chain_start", "data": {}},
+            ]
+        )
 
-                async def mock_events(*args, **kwargs):
-                    yield {"event": "on_tool_start", "data": {}}
-                    yield {"event": "on_chain_start", "data": {}}
+        chunks = []
+        async for chunk in agent.stream("test", "thread_123"):
+            chunks.append(chunk)
 
-                mock_agent.astream_events = mock_events
-                mock_create.return_value = mock_agent
+        assert len(chunks) == 0
 
-                agent = ConversationAgent(mock_checkpointer)
-                chunks = []
-                async for chunk in agent.stream("test", "thread_123"):
-                    chunks.append(chunk)
+    @pytest.mark.asyncio
+    async def test_stream_token_by_token(
+        self, mock_conversation_agent: ConversationAgent, mock_openai_response: str
+    ):
+        chunks = [chunk async for chunk in mock_conversation_agent.stream("test", "thread_123")]
 
-                assert len(chunks) == 0
+        assert chunks == list(MOCK_STREAM_TOKENS)
+        assert "".join(chunks).strip() == mock_openai_response
 
     @pytest.mark.asyncio
-    async def test_invoke_returns_response(self, mock_checkpointer: MagicMock):
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_agent = MagicMock()
-                mock_ai_message = AIMessage(content="AI Response")
-                mock_agent.ainvoke = AsyncMock(return_value={"messages": [mock_ai_message]})
-                mock_create.return_value = mock_agent
+    async def test_stream_single_batched_chunk(
+        self, mock_conversation_agent: ConversationAgent, mock_openai_response: str
+    ):
+        mock_conversation_agent._agent.astream_events.side_effect = batched_stream
 
-                agent = ConversationAgent(mock_checkpointer)
-                result = await agent.invoke("test message", "thread_123")
+        chunks = [chunk async for chunk in mock_conversation_agent.stream("test", "thread_123")]
 
-                assert result == "AI Response"
+        assert len(chunks) == 1
+        assert chunks[0].strip() == mock_openai_response
 
     @pytest.mark.asyncio
-    async def test_invoke_returns_empty_on_no_messages(self, mock_checkpointer: MagicMock):
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_agent = MagicMock()
-                mock_agent.ainvoke = AsyncMock(return_value={"messages": []})
-                mock_create.return_value = mock_agent
-
-                agent = ConversationAgent(mock_checkpointer)
-                result = await agent.invoke("test", "thread_123")
-
-                assert result == ""
-
-    def test_get_history_returns_messages(self, mock_checkpointer: MagicMock):
-        mock_checkpoint = MagicMock()
-        mock_checkpoint.checkpoint = {
-            "channel_values": {
-                "messages": [
-                    HumanMessage(content="Hello"),
-                    AIMessage(content="Hi there!"),
-                ]
+    async def test_invoke_returns_response(self, agent: ConversationAgent):
+        mock_ai_message = AIMessage(content="AI Response")
+        agent._agent.ainvoke.return_value = {"messages": [mock_ai_message]}
+
+        result = await agent.invoke("test message", "thread_123")
+
+        assert result == "AI Response"
+
+    @pytest.mark.asyncio
+    async def test_invoke_returns_empty_on_no_messages(self, agent: ConversationAgent):
+        result = await agent.invoke("test", "thread_123")
+
+        assert result == ""
+
+    @pytest.mark.asyncio
+    async def test_get_history_returns_messages(
+        self, agent: ConversationAgent, mock_checkpointer: MagicMock
+    ):
+        mock_checkpoint = SimpleNamespace(
+            checkpoint={
+                "channel_values": {
+                    "messages": [
+                        HumanMessage(content="Hello"),
+                        AIMessage(content="Hi there!"),
+                    ]
+                }
             }
-        }
-        mock_checkpointer.get_tuple.return_value = mock_checkpoint
+        )
+        mock_checkpointer.aget_tuple.return_value = mock_checkpoint
 
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_create.return_value = MagicMock()
-                agent = ConversationAgent(mock_checkpointer)
+        history = await agent.get_history("thread_123")
 
-                history = agent.get_history("thread_123")
+        assert len(history) == 2
+        assert history[0]["role"] == "user"
+        assert history[0]["content"] == "Hello"
+        assert history[1]["role"] == "assistant"
+        assert history[1]["content"] == "Hi there!"
 
-                assert len(history) == 2
-                assert history[0]["role"] == "user"
-                assert history[0]["content"] == "Hello"
-                assert history[1]["role"] == "assistant"
-                assert history[1]["content"] == "Hi there!"
+    @pytest.mark.asyncio
+    async def test_get_history_labels_system_and_tool_messages(
+        self, agent: ConversationAgent, mock_checkpointer: MagicMock
+    ):
+        mock_checkpoint = SimpleNamespace(
+            checkpoint={
+                "channel_values": {
+                    "messages": [
+                        SystemMessage(content="Be nice"),
+                        ToolMessage(content="42", tool_call_id="call_1"),
+                    ]
+                }
+            }
+        )
+        mock_checkpointer.aget_tuple.return_value = mock_checkpoint
 
-    def test_get_history_returns_empty_on_no_checkpoint(self, mock_checkpointer: MagicMock):
-        mock_checkpointer.get_tuple.return_value = None
+        history = await agent.get_history("thread_123")
 
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_create.return_value = MagicMock()
-                agent = ConversationAgent(mock_checkpointer)
+        assert [m["role"] for m in history] == ["system", "tool"]
 
-                history = agent.get_history("thread_123")
+    @pytest.mark.asyncio
+    async def test_get_history_limit_and_before(
+        self, agent: ConversationAgent, mock_checkpointer: MagicMock
+    ):
+        mock_checkpoint = SimpleNamespace(
+            checkpoint={
+                "channel_values": {
+                    "messages": [
+                        HumanMessage(content="one", id="m1"),
+                        AIMessage(content="two", id="m2"),
+                        HumanMessage(content="three", id="m3"),
+                        AIMessage(content="four", id="m4"),
+                    ]
+                }
+            }
+        )
+        mock_checkpointer.aget_tuple.return_value = mock_checkpoint
 
-                assert history == []
+        tail = await agent.get_history("thread_123", limit=2)
+        page = await agent.get_history("thread_123", limit=2, before="m3")
 
-    def test_get_history_handles_exceptions(self, mock_checkpointer: MagicMock):
-        mock_checkpointer.get_tuple.side_effect = Exception("DB Error")
+        assert [m["id"] for m in tail] == ["m3", "m4"]
+        assert [m["id"] for m in page] == ["m1", "m2"]
+
+    @pytest.mark.asyncio
+    async def test_get_history_returns_empty_on_no_checkpoint(
+        self, agent: ConversationAgent, mock_checkpointer: MagicMock
+    ):
+        mock_checkpointer.aget_tuple.return_value = None
 
-        with patch("modules.langchain.agents.conversation_agent.ChatOpenAI"):
-            with patch("modules.langchain.agents.conversation_agent.create_agent") as mock_create:
-                mock_create.return_value = MagicMock()
-                agent = ConversationAgent(mock_checkpointer)
+        history = await agent.get_history("thread_123")
+
+        assert history == []
+
+    @pytest.mark.asyncio
+    async def test_get_history_handles_exceptions(
+        self, agent: ConversationAgent, mock_checkpointer: MagicMock
+    ):
+        mock_checkpointer.aget_tuple.side_effect = Exception("DB Error")
 
-                history = agent.get_history("thread_123")
+        history = await agent.get_history("thread_123")
 
-                assert history == []
+        assert history == []
 
 
 class TestCheckpointerFactory:
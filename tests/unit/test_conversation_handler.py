@@ -0,0 +1,157 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from modules.langchain.http_handlers import conversation
+from modules.langchain.http_handlers.conversation import event_generator
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def clear_llm_semaphore():
+    conversation._get_llm_semaphore.cache_clear()
+    yield
+    conversation._get_llm_semaphore.cache_clear()
+
+
+def make_agent(chunks: list[str]) -> MagicMock:
+    agent = MagicMock()
+
+    async def mock_stream(*args, **kwargs):
+        for chunk in chunks:
+            yield chunk
+
+    agent.stream = mock_stream
+    return agent
+
+
+async def collect_events(agent: MagicMock) -> list[dict]:
+    return [
+        event async for event in event_generator(agent, "session_1", "thread_1", "user_1", "Hi")
+    ]
+
+
+class TestEventGenerator:
+    @pytest.mark.asyncio
+    async def test_emits_session_message_and_done(self):
+        events = await collect_events(make_agent(["Hello ", "World"]))
+
+        assert events[0]["event"] == "session"
+        assert events[-1]["event"] == "done"
+        done = json.loads(events[-1]["data"])
+        assert done["full_response"] == "Hello World"
+
+    @pytest.mark.asyncio
+    async def test_coalesces_small_chunks(self, monkeypatch):
+        monkeypatch.setattr(conversation, "SSE_FLUSH_INTERVAL", 60)
+        events = await collect_events(make_agent(["a", "b", "c"]))
+
+        messages = [json.loads(e["data"])["chunk"] for e in events if e["event"] == "message"]
+        assert messages == ["abc"]
+
+    @pytest.mark.asyncio
+    async def test_flushes_when_buffer_is_full(self, monkeypatch):
+        monkeypatch.setattr(conversation, "SSE_FLUSH_INTERVAL", 60)
+        monkeypatch.setattr(conversation, "SSE_FLUSH_BYTES", 2)
+        events = await collect_events(make_agent(["a", "b", "c"]))
+
+        messages = [json.loads(e["data"])["chunk"] for e in events if e["event"] == "message"]
+        assert messages == ["ab", "c"]
+
+    @pytest.mark.asyncio
+    async def test_streams_message_on_session_thread(self):
+        agent = MagicMock()
+        calls = []
+
+        async def recording_stream(message: str, thread_id: str):
+            calls.append((message, thread_id))
+            yield "ok"
+
+        agent.stream = recording_stream
+        await collect_events(agent)
+
+        assert calls == [("Hi", "thread_1")]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_streams_are_capped(self, monkeypatch):
+        monkeypatch.setattr(conversation, "_get_llm_semaphore", lambda: semaphore)
+        semaphore = asyncio.Semaphore(1)
+        active = 0
+        peak = 0
+        agent = MagicMock()
+
+        async def slow_stream(*args, **kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            yield "ok"
+            active -= 1
+
+        agent.stream = slow_stream
+        await asyncio.gather(collect_events(agent), collect_events(agent))
+
+        assert peak == 1
+
+    @pytest.mark.asyncio
+    async def test_emits_error_event_on_failure(self):
+        agent = MagicMock()
+
+        async def failing_stream(*args, **kwargs):
+            raise RuntimeError("boom")
+            yield
+
+        agent.stream = failing_stream
+        events = await collect_events(agent)
+
+        assert events[-1]["event"] == "error"
+        assert json.loads(events[-1]["data"])["error"] == "boom"
+
+
+class TestMessageEvent:
+    @pytest.mark.parametrize("chunk", ["plain", 'quote " and \\ slash', "linha\nnova", "ação 🚀"])
+    def test_payload_is_valid_json(self, chunk: str):
+        from modules.langchain.http_handlers.conversation import _message_event
+
+        event = _message_event(chunk)
+
+        assert event["event"] == "message"
+        assert json.loads(event["data"]) == {"chunk": chunk}
+
+
+class TestListUserSessions:
+    @pytest.mark.asyncio
+    async def test_streams_ndjson(self):
+        from datetime import datetime
+
+        from modules.langchain.http_handlers.conversation import list_user_sessions
+
+        docs = [
+            {"session_id": "s1", "created_at": datetime(2024, 1, 1)},
+            {"session_id": "s2", "created_at": datetime(2024, 1, 2)},
+        ]
+        service = MagicMock()
+
+        async def iter_docs(user_id, limit, skip):
+            for doc in docs:
+                yield doc
+
+        service.iter_user_session_documents = iter_docs
+
+        response = await list_user_sessions("user_1", limit=50, skip=0, session_service=service)
+        body = b"".join([line async for line in response.body_iterator])
+
+        assert response.media_type == "application/x-ndjson"
+        assert [json.loads(line)["session_id"] for line in body.splitlines()] == ["s1", "s2"]
+
+
+class TestGetConversationAgent:
+    async def test_returns_agent_built_at_startup(self):
+        agent = make_agent([])
+        request = MagicMock()
+        request.app.state.agent = agent
+
+        assert await conversation.get_conversation_agent(request) is agent
@@ -0,0 +1,183 @@
+import io
+import logging
+import time
+from logging.handlers import QueueHandler
+
+import pytest
+
+from shared.services import logger as logger_module
+from shared.services.logger import LOG_DATEFMT, BatchingHandler, CachedTimeFormatter
+
+pytestmark = pytest.mark.unit
+
+
+def make_record(created: float) -> logging.LogRecord:
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "hello", None, None)
+    record.created = created
+    return record
+
+
+class TestCachedTimeFormatter:
+    def test_matches_strftime(self):
+        formatter = CachedTimeFormatter()
+        now = time.time()
+
+        assert formatter.formatTime(make_record(now)) == time.strftime(
+            LOG_DATEFMT, time.localtime(now)
+        )
+
+    def test_reuses_timestamp_within_same_second(self):
+        formatter = CachedTimeFormatter()
+        second = float(int(time.time()))
+
+        first = formatter.formatTime(make_record(second + 0.1))
+        second_text = formatter.formatTime(make_record(second + 0.9))
+
+        assert first is second_text
+
+    def test_reformats_on_next_second(self):
+        formatter = CachedTimeFormatter()
+        second = float(int(time.time()))
+
+        first = formatter.formatTime(make_record(second))
+        later = formatter.formatTime(make_record(second + 1))
+
+        assert later == time.strftime(LOG_DATEFMT, time.localtime(second + 1))
+        assert later != first
+
+    def test_format_layout(self):
+        formatter = CachedTimeFormatter()
+
+        line = formatter.format(make_record(time.time()))
+
+        assert line.endswith(" | INFO     | test | hello")
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return super().write(text)
+
+
+class TestBatchingHandler:
+    @pytest.fixture
+    def stream(self) -> CountingStream:
+        return CountingStream()
+
+    @pytest.fixture
+    def batching(self, stream: CountingStream):
+        target = logging.StreamHandler(stream)
+        target.setFormatter(logging.Formatter("%(message)s"))
+        handler = BatchingHandler(target, capacity=3, interval=60)
+        yield handler
+        handler.close()
+
+    def test_buffers_until_capacity(self, batching: BatchingHandler, stream: CountingStream):
+        batching.handle(make_record(time.time()))
+        batching.handle(make_record(time.time()))
+
+        assert stream.getvalue() == ""
+
+        batching.handle(make_record(time.time()))
+
+        assert stream.getvalue() == "hello\nhello\nhello\n"
+        assert stream.writes == 1
+
+    def test_error_flushes_immediately(self, batching: BatchingHandler, stream: CountingStream):
+        record = make_record(time.time())
+        record.levelno = logging.ERROR
+
+        batching.handle(record)
+
+        assert stream.getvalue() == "hello\n"
+
+    def test_write_error_reports_first_record(
+        self,
+        batching: BatchingHandler,
+        stream: CountingStream,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        first = make_record(time.time())
+        batching.handle(first)
+        batching.handle(make_record(time.time()))
+        reported = []
+        monkeypatch.setattr(stream, "write", lambda text: 1 / 0)
+        monkeypatch.setattr(batching.target, "handleError", reported.append)
+
+        batching.flush()
+
+        assert reported == [first]
+        assert batching.buffer == []
+
+    def test_close_flushes_buffer(self, stream: CountingStream):
+        batching = BatchingHandler(logging.StreamHandler(stream), capacity=100, interval=60)
+        batching.handle(make_record(time.time()))
+
+        batching.close()
+
+        assert stream.getvalue() == "hello\n"
+
+    def test_periodic_flush(self, stream: CountingStream):
+        batching = BatchingHandler(logging.StreamHandler(stream), capacity=100, interval=0.01)
+        try:
+            batching.handle(make_record(time.time()))
+            deadline = time.monotonic() + 2
+            while not stream.getvalue() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert stream.getvalue() == "hello\n"
+        finally:
+            batching.close()
+
+
+class TestSetupLogging:
+    @pytest.fixture
+    def bare_root(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        saved_listener = logger_module._listener
+        logger_module._listener = None
+        yield root
+        logger_module.shutdown_logging()
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        logger_module._listener = saved_listener
+
+    def test_root_only_enqueues(self, bare_root: logging.Logger):
+        # pytest attaches its capture handler per phase, so clear it here
+        bare_root.handlers = []
+        logger_module.setup_logging()
+
+        assert len(bare_root.handlers) == 1
+        assert isinstance(bare_root.handlers[0], QueueHandler)
+        assert logger_module._listener is not None
+
+    def test_setup_is_idempotent(self, bare_root: logging.Logger):
+        bare_root.handlers = []
+        logger_module.setup_logging()
+        listener = logger_module._listener
+
+        logger_module.setup_logging()
+
+        assert len(bare_root.handlers) == 1
+        assert logger_module._listener is listener
+
+    def test_not_configured_on_import_under_pytest(self):
+        assert not any(isinstance(h, QueueHandler) for h in logging.getLogger().handlers)
+
+    def test_shutdown_drains_and_writes_directly(self, bare_root: logging.Logger, capsys):
+        bare_root.handlers = []
+        logger_module.setup_logging()
+        logging.getLogger("test").info("queued")
+
+        logger_module.shutdown_logging()
+        logging.getLogger("test").info("direct")
+
+        out = capsys.readouterr().out
+        assert "| test | queued" in out
+        assert "| test | direct" in out
+        assert not any(isinstance(h, QueueHandler) for h in bare_root.handlers)
@@ -1,77 +1,87 @@
+import re
+from collections.abc import Mapping
+from datetime import UTC, datetime
+
 import pytest
-from datetime import datetime, timezone
-from unittest.mock import patch
-import uuid
 
-from shared.models.users_model import UsersModel
 from shared.models.sessions_model import (
-    SessionsModel,
     SessionCreate,
     SessionResponse,
+    SessionsModel,
     generate_session_id,
     utc_now,
 )
-
+from shared.models.users_model import LoginRequest, RegisterRequest, UsersModel
 
 pytestmark = pytest.mark.unit
 
+# Canonical (lowercase, hyphenated) form produced by str(uuid.uuid4())
+_UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+_NOW = datetime.now(UTC)
+
+# Valid UsersModel arguments; tests override single fields
+_USER_FIELDS = {
+    "user_id": "user_123",
+    "name": "John Doe",
+    "email": "john@example.com",
+    "created_at": _NOW,
+    "updated_at": _NOW,
+}
+
 
 class TestUsersModel:
-    def test_create_user_with_required_fields(self):
-        now = datetime.now(timezone.utc)
-        user = UsersModel(
-            user_id="user_123",
-            name="John Doe",
-            email="john@example.com",
-            created_at=now,
-            updated_at=now,
-        )
+    @pytest.mark.parametrize(
+        ("overrides", "expected"),
+        [
+            ({}, {"user_id": "user_123", "name": "John Doe", "email": "john@example.com"}),
+            ({"email": "  JOHN@EXAMPLE.COM  "}, {"email": "john@example.com"}),
+            (
+                {
+                    "google_id": "google_abc",
+                    "given_name": "John",
+                    "family_name": "Doe",
+                    "picture": "https://example.com/photo.jpg",
+                },
+                {
+                    "google_id": "google_abc",
+                    "given_name": "John",
+                    "family_name": "Doe",
+                    "picture": "https://example.com/photo.jpg",
+                },
+            ),
+        ],
+        ids=["required_fields", "email_normalization", "optional_google_fields"],
+    )
+    def test_create_user(self, overrides: dict, expected: dict):
+        user = UsersModel(**{**_USER_FIELDS, **overrides})
+
+        assert {field: getattr(user, field) for field in expected} == expected
 
-        assert user.user_id == "user_123"
-        assert user.name == "John Doe"
-        assert user.email == "john@example.com"
+    def test_invalid_email_raises_error(self):
+        with pytest.raises(ValueError):
+            UsersModel(**{**_USER_FIELDS, "email": "invalid-email"})
 
-    def test_email_normalization(self):
-        now = datetime.now(timezone.utc)
-        user = UsersModel(
-            user_id="user_123",
-            name="John Doe",
-            email="  JOHN@EXAMPLE.COM  ",
-            created_at=now,
-            updated_at=now,
-        )
 
-        assert user.email == "john@example.com"
-
-    def test_optional_google_fields(self):
-        now = datetime.now(timezone.utc)
-        user = UsersModel(
-            user_id="user_123",
-            name="John Doe",
-            email="john@example.com",
-            google_id="google_abc",
-            given_name="John",
-            family_name="Doe",
-            picture="https://example.com/photo.jpg",
-            created_at=now,
-            updated_at=now,
+class TestAuthRequests:
+    def test_login_request_normalizes_email(self):
+        form = LoginRequest(email="  JOHN@EXAMPLE.COM  ", password="secret")
+
+        assert form.email == "john@example.com"
+
+    def test_register_request_normalizes_email(self):
+        form = RegisterRequest(
+            name="John",
+            email="  JOHN@EXAMPLE.COM  ",
+            password="secret",
+            password_confirm="secret",
         )
 
-        assert user.google_id == "google_abc"
-        assert user.given_name == "John"
-        assert user.family_name == "Doe"
-        assert user.picture == "https://example.com/photo.jpg"
+        assert form.email == "john@example.com"
 
-    def test_invalid_email_raises_error(self):
-        now = datetime.now(timezone.utc)
+    def test_login_request_invalid_email_raises_error(self):
         with pytest.raises(ValueError):
-            UsersModel(
-                user_id="user_123",
-                name="John Doe",
-                email="invalid-email",
-                created_at=now,
-                updated_at=now,
-            )
+            LoginRequest(email="invalid-email", password="secret")
 
 
 class TestSessionsModel:
@@ -92,7 +102,7 @@ class TestSessionsModel:
         assert "created_at" in doc
         assert "updated_at" in doc
 
-    def test_from_document(self, sample_session_doc: dict):
+    def test_from_document(self, sample_session_doc: Mapping):
         session = SessionsModel.from_document(sample_session_doc)
 
         assert session.session_id == sample_session_doc["session_id"]
@@ -105,8 +115,8 @@ class TestSessionsModel:
             "_id": "fallback_id",
             "user_id": "user_123",
             "name": "Test",
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc),
+            "created_at": _NOW,
+            "updated_at": _NOW,
         }
         session = SessionsModel.from_document(doc)
 
@@ -169,12 +179,12 @@ class TestSessionResponse:
 class TestUtilityFunctions:
     def test_generate_session_id_returns_uuid(self):
         session_id = generate_session_id()
-        uuid.UUID(session_id)
+        assert _UUID_RE.fullmatch(session_id)
 
     def test_generate_session_id_unique(self):
-        ids = [generate_session_id() for _ in range(100)]
-        assert len(set(ids)) == 100
+        ids = {generate_session_id() for _ in range(100)}
+        assert len(ids) == 100
 
     def test_utc_now_returns_utc(self):
         now = utc_now()
-        assert now.tzinfo == timezone.utc
+        assert now.tzinfo == UTC
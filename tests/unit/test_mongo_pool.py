@@ -1,140 +1,254 @@
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
 import pytest
-from unittest.mock import MagicMock, patch
 
+from config.settings import get_settings
+from shared.persistance import mongo_db
+from shared.persistance.mongo_db import MongoDBPool, get_database, get_mongo_client
 
 pytestmark = pytest.mark.unit
 
 
+# Patched once for the module; reset_singleton clears them between tests
+@pytest.fixture(scope="module")
+def mock_client_class() -> Iterator[MagicMock]:
+    patcher = patch("shared.persistance.mongo_db.MongoClient")
+    yield patcher.start()
+    patcher.stop()
+
+
+@pytest.fixture(scope="module")
+def mock_async_class() -> Iterator[MagicMock]:
+    patcher = patch("shared.persistance.mongo_db.AsyncMongoClient")
+    yield patcher.start()
+    patcher.stop()
+
+
+# MongoDBPool is a process-wide singleton; keep these tests on one worker
+@pytest.mark.xdist_group("mongo_singleton")
 class TestMongoDBPool:
     @pytest.fixture(autouse=True)
-    def reset_singleton(self):
-        from shared.persistance.mongo_db import MongoDBPool
+    def reset_singleton(self, mock_client_class: MagicMock, mock_async_class: MagicMock):
+        mock_client_class.reset_mock(return_value=True, side_effect=True)
+        mock_async_class.reset_mock(return_value=True, side_effect=True)
         MongoDBPool._instance = None
         MongoDBPool._client = None
+        MongoDBPool._async_client = None
+        get_mongo_client.cache_clear()
+        get_database.cache_clear()
         yield
         MongoDBPool._instance = None
         MongoDBPool._client = None
+        MongoDBPool._async_client = None
+        get_mongo_client.cache_clear()
+        get_database.cache_clear()
 
     def test_singleton_pattern(self):
-        from shared.persistance.mongo_db import MongoDBPool
         pool1 = MongoDBPool()
         pool2 = MongoDBPool()
 
         assert pool1 is pool2
 
-    def test_connect_creates_client(self):
-        from shared.persistance.mongo_db import MongoDBPool
+    def test_connect_creates_client(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_client_class.return_value = mock_client
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_client_class.return_value = mock_client
+        pool = MongoDBPool()
+        client = pool.connect("mongodb://localhost:27017")
+
+        mock_client_class.assert_called_once()
+        assert client is mock_client
 
-            pool = MongoDBPool()
-            client = pool.connect("mongodb://localhost:27017")
+    def test_connect_uses_pool_settings(self, mock_client_class: MagicMock):
+        settings = get_settings()
 
-            mock_client_class.assert_called_once()
-            assert client is mock_client
+        mock_client_class.return_value.admin.command.return_value = {"ok": 1}
+
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+
+        kwargs = mock_client_class.call_args.kwargs
+        assert kwargs["maxPoolSize"] == settings.MONGO_MAX_POOL_SIZE
+        assert kwargs["minPoolSize"] == settings.MONGO_MIN_POOL_SIZE
+        assert kwargs["maxIdleTimeMS"] == settings.MONGO_MAX_IDLE_TIME_MS
+        assert kwargs["maxConnecting"] == settings.MONGO_MAX_CONNECTING
+        assert kwargs["waitQueueTimeoutMS"] == settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+        assert kwargs["serverSelectionTimeoutMS"] == settings.MONGO_SERVER_SELECTION_TIMEOUT_MS
+        assert kwargs["retryWrites"] is True
+        assert kwargs["w"] == "majority"
+        assert kwargs["readPreference"] == "primary"
+
+    def test_connect_reuses_existing_client(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_client_class.return_value = mock_client
 
-    def test_connect_reuses_existing_client(self):
-        from shared.persistance.mongo_db import MongoDBPool
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        pool.connect("mongodb://localhost:27017")
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_client_class.return_value = mock_client
+        assert mock_client_class.call_count == 1
 
-            pool = MongoDBPool()
-            pool.connect("mongodb://localhost:27017")
-            pool.connect("mongodb://localhost:27017")
+    def test_connect_does_not_ping(self, mock_client_class: MagicMock):
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
 
-            assert mock_client_class.call_count == 1
+        mock_client_class.return_value.admin.command.assert_not_called()
 
-    def test_get_database(self):
-        from shared.persistance.mongo_db import MongoDBPool
+    def test_concurrent_connect_creates_one_client(self, mock_client_class: MagicMock):
+        pool = MongoDBPool()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(
+                executor.map(lambda _: pool.connect("mongodb://localhost:27017"), range(32))
+            )
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_db = MagicMock()
-            mock_client.__getitem__.return_value = mock_db
-            mock_client_class.return_value = mock_client
+        assert mock_client_class.call_count == 1
+        assert all(client is clients[0] for client in clients)
 
-            pool = MongoDBPool()
-            pool.connect("mongodb://localhost:27017")
-            db = pool.get_database("test_db")
+    @pytest.mark.asyncio
+    async def test_warmup_pings_server(self, mock_client_class: MagicMock):
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        await pool.warmup()
 
-            mock_client.__getitem__.assert_called_with("test_db")
-            assert db is mock_db
+        mock_client_class.return_value.admin.command.assert_called_once_with("ping")
 
-    def test_get_collection(self):
-        from shared.persistance.mongo_db import MongoDBPool
+    def test_get_database(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_db = MagicMock()
+        mock_client.__getitem__.return_value = mock_db
+        mock_client_class.return_value = mock_client
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_db = MagicMock()
-            mock_collection = MagicMock()
-            mock_db.__getitem__.return_value = mock_collection
-            mock_client.__getitem__.return_value = mock_db
-            mock_client_class.return_value = mock_client
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        db = pool.get_database("test_db")
 
-            pool = MongoDBPool()
-            pool.connect("mongodb://localhost:27017")
-            collection = pool.get_collection("test_collection", "test_db")
+        mock_client.__getitem__.assert_called_with("test_db")
+        assert db is mock_db
 
-            mock_db.__getitem__.assert_called_with("test_collection")
-            assert collection is mock_collection
+    def test_get_database_memoized_until_close(self, mock_client_class: MagicMock):
+        mock_client = mock_client_class.return_value
 
-    def test_close(self):
-        from shared.persistance.mongo_db import MongoDBPool
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        first = pool.get_collection("test_collection", "test_db")
+        second = pool.get_collection("test_collection", "test_db")
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_client_class.return_value = mock_client
+        assert first is second
+        assert mock_client.__getitem__.call_count == 1
 
-            pool = MongoDBPool()
-            pool.connect("mongodb://localhost:27017")
-            pool.close()
+        pool.close()
+        pool.connect("mongodb://localhost:27017")
+        pool.get_database("test_db")
 
-            mock_client.close.assert_called_once()
-            assert pool._client is None
+        assert mock_client.__getitem__.call_count == 2
 
-    def test_close_when_not_connected(self):
-        from shared.persistance.mongo_db import MongoDBPool
+    def test_get_collection(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_db = MagicMock()
+        mock_collection = MagicMock()
+        mock_db.__getitem__.return_value = mock_collection
+        mock_client.__getitem__.return_value = mock_db
+        mock_client_class.return_value = mock_client
 
         pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        collection = pool.get_collection("test_collection", "test_db")
+
+        mock_db.__getitem__.assert_called_with("test_collection")
+        assert collection is mock_collection
+
+    def test_close(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_client_class.return_value = mock_client
+
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
         pool.close()
 
-    def test_client_property_connects_if_needed(self):
-        from shared.persistance.mongo_db import MongoDBPool
+        mock_client.close.assert_called_once()
+        assert pool._client is None
+
+    def test_close_when_not_connected(self):
+        pool = MongoDBPool()
+        pool.close()
+
+    def test_client_property_connects_if_needed(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_client_class.return_value = mock_client
+
+        pool = MongoDBPool()
+        _ = pool.client
+
+        mock_client_class.assert_called_once()
+
+    def test_async_client_reuses_uri(
+        self, mock_client_class: MagicMock, mock_async_class: MagicMock
+    ):
+        mock_client_class.return_value.admin.command.return_value = {"ok": 1}
+
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        first = pool.async_client
+        second = pool.async_client
+
+        mock_async_class.assert_called_once()
+        assert mock_async_class.call_args.args[0] == "mongodb://localhost:27017"
+        assert first is second
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_both_clients(
+        self, mock_client_class: MagicMock, mock_async_class: MagicMock
+    ):
+        mock_client = mock_client_class.return_value
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_async_client = mock_async_class.return_value
+        mock_async_client.close = AsyncMock()
+
+        pool = MongoDBPool()
+        pool.connect("mongodb://localhost:27017")
+        _ = pool.async_client
+        await pool.aclose()
+
+        mock_async_client.close.assert_awaited_once()
+        mock_client.close.assert_called_once()
+        assert pool._async_client is None
+        assert pool._client is None
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_client_class.return_value = mock_client
+    def test_get_mongo_client_dependency(self, mock_client_class: MagicMock):
+        mock_client = MagicMock()
+        mock_client.admin.command.return_value = {"ok": 1}
+        mock_client_class.return_value = mock_client
 
-            pool = MongoDBPool()
-            _ = pool.client
+        original_pool = mongo_db.mongo_pool
 
-            mock_client_class.assert_called_once()
+        mongo_db.mongo_pool = MongoDBPool()
+        mongo_db.mongo_pool.connect("mongodb://localhost:27017")
 
-    def test_get_mongo_client_dependency(self):
-        from shared.persistance.mongo_db import MongoDBPool, get_mongo_client
+        client = get_mongo_client()
 
-        with patch("shared.persistance.mongo_db.MongoClient") as mock_client_class:
-            mock_client = MagicMock()
-            mock_client.admin.command.return_value = {"ok": 1}
-            mock_client_class.return_value = mock_client
+        assert client is mock_client
+        mongo_db.mongo_pool = original_pool
 
-            from shared.persistance import mongo_db
-            original_pool = mongo_db.mongo_pool
+    def test_get_mongo_client_cached_until_close(self, mock_client_class: MagicMock):
+        first_client, second_client = MagicMock(), MagicMock()
+        mock_client_class.side_effect = [first_client, second_client]
 
-            mongo_db.mongo_pool = MongoDBPool()
-            mongo_db.mongo_pool.connect("mongodb://localhost:27017")
+        original_pool = mongo_db.mongo_pool
+        mongo_db.mongo_pool = mongo_db.MongoDBPool()
+        try:
+            assert mongo_db.get_mongo_client() is first_client
+            assert mongo_db.get_mongo_client() is first_client
 
-            client = get_mongo_client()
+            mongo_db.mongo_pool.close()
 
-            assert client is mock_client
+            assert mongo_db.get_mongo_client() is second_client
+        finally:
             mongo_db.mongo_pool = original_pool
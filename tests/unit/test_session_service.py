@@ -1,200 +1,356 @@
-import pytest
-from datetime import datetime, timezone
-from unittest.mock import MagicMock, patch
+from collections.abc import Mapping
+from datetime import UTC, datetime
+from types import MappingProxyType
+from unittest.mock import MagicMock
 
-from shared.models.sessions_model import SessionsModel, SessionCreate, SessionResponse
-from modules.langchain.services.session_service import SessionService
-from tests.conftest import MockCursor, create_mock_find
+import pytest
+from pymongo.results import DeleteResult
 
+from modules.langchain.services.session_service import _SESSION_PROJECTION, SessionService
+from shared.models.sessions_model import SessionCreate, SessionResponse, SessionsModel
+from tests.conftest import create_mock_find
 
 pytestmark = pytest.mark.unit
 
+# Real pymongo results; only deleted_count is read
+_DELETED_ONE = DeleteResult({"n": 1}, acknowledged=True)
+_DELETED_NONE = DeleteResult({"n": 0}, acknowledged=True)
+
+# Expected query filters for sample_session_doc, frozen so no test can alter them
+_FILTER_SID = MappingProxyType({"session_id": "session_456"})
+_FILTER_TID = MappingProxyType({"thread_id": "session_456"})
+
 
 class TestSessionService:
+    @pytest.fixture(autouse=True)
+    def clear_pending_touches(self):
+        from modules.langchain.services import session_service
+
+        session_service._pending_touches.clear()
+        yield
+        session_service._pending_touches.clear()
+
+    @pytest.fixture(scope="class")
+    def shared_session_service(self, shared_async_collection: MagicMock) -> SessionService:
+        return SessionService(collection=shared_async_collection)
+
     @pytest.fixture
-    def session_service(self, mock_mongo_collection: MagicMock) -> SessionService:
-        return SessionService(collection=mock_mongo_collection)
+    def session_service(
+        self,
+        shared_session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ) -> SessionService:
+        # mock_async_collection resets the shared collection the service holds
+        return shared_session_service
+
+    async def test_ensure_indexes(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ):
+        await session_service.ensure_indexes()
 
-    def test_create_session_success(
+        created = [c.args[0] for c in mock_async_collection.create_index.await_args_list]
+        assert "session_id" in created
+        assert "thread_id" in created
+        assert [("user_id", 1), ("updated_at", -1)] in created
+
+    async def test_create_session_success(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
         sample_session_create: SessionCreate,
     ):
-        result = session_service.create_session(sample_session_create)
+        result = await session_service.create_session(sample_session_create)
 
         assert isinstance(result, SessionResponse)
         assert result.user_id == sample_session_create.user_id
         assert result.is_new is True
-        mock_mongo_collection.insert_one.assert_called_once()
+        mock_async_collection.insert_one.assert_awaited_once()
 
-    def test_create_session_uses_custom_name(
+    async def test_create_session_uses_custom_name(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
     ):
         create = SessionCreate(user_id="user_123", name="My Custom Chat")
-        result = session_service.create_session(create)
+        result = await session_service.create_session(create)
 
         assert result.name == "My Custom Chat"
 
-    def test_get_session_found(
+    async def test_bulk_create_single_insert_many(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
     ):
-        mock_mongo_collection.find_one.return_value = sample_session_doc
+        items = [SessionCreate(user_id="user_123", name=f"Chat {i}") for i in range(3)]
 
-        result = session_service.get_session("session_456")
+        results = await session_service.bulk_create(items)
 
-        assert result is not None
-        assert isinstance(result, SessionsModel)
-        assert result.session_id == "session_456"
-        mock_mongo_collection.find_one.assert_called_once_with({"session_id": "session_456"})
+        assert [r.name for r in results] == ["Chat 0", "Chat 1", "Chat 2"]
+        mock_async_collection.insert_many.assert_awaited_once()
+        docs = mock_async_collection.insert_many.await_args.args[0]
+        assert len(docs) == 3
+        assert mock_async_collection.insert_many.await_args.kwargs == {"ordered": False}
+        mock_async_collection.insert_one.assert_not_awaited()
+
+    async def test_bulk_create_empty(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ):
+        assert await session_service.bulk_create([]) == []
+        mock_async_collection.insert_many.assert_not_awaited()
 
-    def test_get_session_not_found(
+    @pytest.mark.parametrize("found", [True, False], ids=["found", "not_found"])
+    async def test_get_session(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
+        found: bool,
     ):
-        mock_mongo_collection.find_one.return_value = None
+        mock_async_collection.find_one.return_value = sample_session_doc if found else None
 
-        result = session_service.get_session("nonexistent")
+        result = await session_service.get_session("session_456")
 
-        assert result is None
+        if found:
+            assert isinstance(result, SessionsModel)
+            assert result.session_id == "session_456"
+        else:
+            assert result is None
+        mock_async_collection.find_one.assert_awaited_once_with(
+            _FILTER_SID,
+            projection=_SESSION_PROJECTION,
+        )
 
-    def test_get_session_by_thread(
+    async def test_get_session_by_thread(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        mock_mongo_collection.find_one.return_value = sample_session_doc
+        mock_async_collection.find_one.return_value = sample_session_doc
 
-        result = session_service.get_session_by_thread("session_456")
+        result = await session_service.get_session_by_thread("session_456")
 
         assert result is not None
-        mock_mongo_collection.find_one.assert_called_once_with({"thread_id": "session_456"})
+        mock_async_collection.find_one.assert_awaited_once_with(
+            _FILTER_TID,
+            projection=_SESSION_PROJECTION,
+        )
 
-    def test_list_user_sessions(
+    async def test_list_user_sessions(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
+        single_session_find,
     ):
-        mock_mongo_collection.find = create_mock_find([sample_session_doc])
+        mock_async_collection.find.side_effect = single_session_find
 
-        result = session_service.list_user_sessions("user_123")
+        result = await session_service.list_user_sessions("user_123")
 
         assert len(result) == 1
         assert result[0].session_id == "session_456"
 
-    def test_list_user_sessions_empty(
+    async def test_list_user_sessions_paginates(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        mock_mongo_collection.find = create_mock_find([])
+        docs = [{**sample_session_doc, "session_id": f"s{i}"} for i in range(5)]
+        mock_async_collection.find.side_effect = create_mock_find(docs)
 
-        result = session_service.list_user_sessions("user_with_no_sessions")
+        result = await session_service.list_user_sessions("user_123", limit=2, skip=1)
 
-        assert len(result) == 0
+        assert [s.session_id for s in result] == ["s1", "s2"]
 
-    def test_touch_session_success(
+    async def test_list_user_sessions_newest_first(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        mock_mongo_collection.find_one_and_update.return_value = sample_session_doc
+        docs = [
+            {
+                **sample_session_doc,
+                "session_id": f"s{i}",
+                "updated_at": datetime(2024, 1, i + 1, tzinfo=UTC),
+            }
+            for i in range(3)
+        ]
+        mock_async_collection.find.side_effect = create_mock_find(docs)
 
-        result = session_service.touch_session("session_456")
+        result = await session_service.list_user_sessions("user_123")
 
-        assert result is not None
-        mock_mongo_collection.find_one_and_update.assert_called_once()
+        assert [s.session_id for s in result] == ["s2", "s1", "s0"]
 
-    def test_touch_session_not_found(
+    async def test_iter_user_session_documents_strips_id(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        mock_mongo_collection.find_one_and_update.return_value = None
+        legacy_doc = {"_id": "legacy_1", "user_id": "user_123", "name": "Old"}
+        mock_async_collection.find.side_effect = create_mock_find(
+            [dict(sample_session_doc), legacy_doc]
+        )
 
-        result = session_service.touch_session("nonexistent")
+        docs = [doc async for doc in session_service.iter_user_session_documents("user_123")]
 
-        assert result is None
+        assert all("_id" not in doc for doc in docs)
+        assert docs[0]["session_id"] == "session_456"
+        assert docs[1]["session_id"] == docs[1]["thread_id"] == "legacy_1"
 
-    def test_update_session_name_success(
+    async def test_get_most_recent_session(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        updated_doc = {**sample_session_doc, "name": "New Name"}
-        mock_mongo_collection.find_one_and_update.return_value = updated_doc
+        mock_async_collection.find_one.return_value = sample_session_doc
 
-        result = session_service.update_session_name("session_456", "New Name")
+        result = await session_service.get_most_recent_session("user_123")
 
-        assert result is not None
-        assert result.name == "New Name"
+        assert result.session_id == "session_456"
+        assert mock_async_collection.find_one.await_args.kwargs["sort"] == [("updated_at", -1)]
 
-    def test_update_session_name_not_found(
+    async def test_get_most_recent_session_none(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
     ):
-        mock_mongo_collection.find_one_and_update.return_value = None
-
-        result = session_service.update_session_name("nonexistent", "New Name")
+        result = await session_service.get_most_recent_session("user_without_sessions")
 
         assert result is None
 
-    def test_delete_session_success(
+    async def test_list_user_sessions_empty(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ):
+        # find() defaults to the shared EMPTY_CURSOR
+        result = await session_service.list_user_sessions("user_with_no_sessions")
+
+        assert len(result) == 0
+
+    @pytest.mark.parametrize("found", [True, False], ids=["success", "not_found"])
+    async def test_touch_session(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
+        found: bool,
     ):
-        mock_mongo_collection.delete_one.return_value = MagicMock(deleted_count=1)
+        mock_async_collection.find_one_and_update.return_value = (
+            sample_session_doc if found else None
+        )
 
-        result = session_service.delete_session("session_456")
+        result = await session_service.touch_session("session_456")
 
-        assert result is True
-        mock_mongo_collection.delete_one.assert_called_once_with({"session_id": "session_456"})
+        assert (result is not None) is found
+        mock_async_collection.find_one_and_update.assert_awaited_once()
+        update = mock_async_collection.find_one_and_update.await_args.args[1]
+        assert update == {"$currentDate": {"updated_at": True}}
 
-    def test_delete_session_not_found(
+    @pytest.mark.parametrize("found", [True, False], ids=["success", "not_found"])
+    async def test_update_session_name(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
+        found: bool,
+    ):
+        updated_doc = dict(sample_session_doc, name="New Name")
+        mock_async_collection.find_one_and_update.return_value = updated_doc if found else None
+
+        result = await session_service.update_session_name("session_456", "New Name")
+
+        if found:
+            assert result.name == "New Name"
+        else:
+            assert result is None
+        update = mock_async_collection.find_one_and_update.await_args.args[1]
+        assert update == {"$set": {"name": "New Name"}, "$currentDate": {"updated_at": True}}
+
+    @pytest.mark.parametrize(
+        ("delete_result", "deleted"),
+        [(_DELETED_ONE, True), (_DELETED_NONE, False)],
+        ids=["success", "not_found"],
+    )
+    async def test_delete_session(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
+        delete_result: DeleteResult,
+        deleted: bool,
     ):
-        mock_mongo_collection.delete_one.return_value = MagicMock(deleted_count=0)
+        mock_async_collection.delete_one.return_value = delete_result
 
-        result = session_service.delete_session("nonexistent")
+        result = await session_service.delete_session("session_456")
 
-        assert result is False
+        assert result is deleted
+        mock_async_collection.delete_one.assert_awaited_once_with(_FILTER_SID)
 
-    def test_get_or_create_default_session_returns_existing(
+    async def test_get_or_create_default_session_returns_existing(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
-        sample_session_doc: dict,
+        mock_async_collection: MagicMock,
+        sample_session_doc: Mapping,
     ):
-        mock_mongo_collection.find = create_mock_find([sample_session_doc])
-        mock_mongo_collection.find_one_and_update.return_value = sample_session_doc
+        mock_async_collection.find_one_and_update.return_value = sample_session_doc
 
-        result = session_service.get_or_create_default_session("user_123")
+        result = await session_service.get_or_create_default_session("user_123")
 
         assert result.is_new is False
         assert result.session_id == "session_456"
+        mock_async_collection.find_one_and_update.assert_awaited_once()
+        assert mock_async_collection.find_one_and_update.await_args.kwargs["sort"] == [
+            ("updated_at", -1)
+        ]
 
-    def test_get_or_create_default_session_creates_new(
+    async def test_get_or_create_default_session_creates_new(
         self,
         session_service: SessionService,
-        mock_mongo_collection: MagicMock,
+        mock_async_collection: MagicMock,
     ):
-        mock_mongo_collection.find = create_mock_find([])
+        mock_async_collection.find_one_and_update.return_value = None
 
-        result = session_service.get_or_create_default_session("user_123", "New Chat")
+        result = await session_service.get_or_create_default_session("user_123", "New Chat")
 
         assert result.is_new is True
-        mock_mongo_collection.insert_one.assert_called_once()
+        mock_async_collection.insert_one.assert_awaited_once()
+
+    async def test_schedule_touch_is_flushed_in_one_bulk_write(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ):
+        session_service.schedule_touch("s1")
+        session_service.schedule_touch("s2")
+        session_service.schedule_touch("s1")
+
+        flushed = await session_service.flush_touches()
+
+        assert flushed == 2
+        mock_async_collection.bulk_write.assert_awaited_once()
+        operations = mock_async_collection.bulk_write.await_args.args[0]
+        assert sorted(op._filter["session_id"] for op in operations) == ["s1", "s2"]
+        assert all(op._doc == {"$currentDate": {"updated_at": True}} for op in operations)
+        assert await session_service.flush_touches() == 0
+
+    async def test_failed_flush_keeps_pending_touches(
+        self,
+        session_service: SessionService,
+        mock_async_collection: MagicMock,
+    ):
+        session_service.schedule_touch("s1")
+        mock_async_collection.bulk_write.side_effect = ConnectionError("mongo down")
+
+        with pytest.raises(ConnectionError):
+            await session_service.flush_touches()
+
+        mock_async_collection.bulk_write.side_effect = None
+        session_service.schedule_touch("s2")
+        assert await session_service.flush_touches() == 2
@@ -1,49 +1,44 @@
 import pytest
-import os
-from unittest.mock import patch
 
+from config.settings import Settings, get_settings
+from tests.conftest import settings_for
 
 pytestmark = pytest.mark.unit
 
 
 class TestSettings:
+    @staticmethod
+    def _clear_settings_cache() -> None:
+        # Most tests here never call get_settings(); skip the clear when empty
+        if get_settings.cache_info().currsize:
+            get_settings.cache_clear()
+
     @pytest.fixture(autouse=True)
     def clear_cache(self):
-        from config.settings import get_settings
-        get_settings.cache_clear()
+        self._clear_settings_cache()
         yield
-        get_settings.cache_clear()
+        self._clear_settings_cache()
 
     def test_default_values(self):
-        env_override = {
-            "HOST": "",
-            "PORT": "",
-            "MONGO_DB": "",
-            "OPENAI_MODEL": "",
-            "JWT_SECRET": "",
-        }
-        with patch.dict(os.environ, env_override, clear=False):
-            from config.settings import Settings
-
-            default_settings = Settings(
-                HOST="0.0.0.0",
-                PORT=8000,
-                MONGO_DB="langchain",
-                CHECKPOINT_COLLECTION="checkpoints",
-                SESSIONS_COLLECTION="user_sessions",
-                OPENAI_MODEL="gpt-4o-mini",
-                JWT_SECRET="supersecret",
-                LANGSMITH_TRACING=False,
-            )
-
-            assert default_settings.HOST == "0.0.0.0"
-            assert default_settings.PORT == 8000
-            assert default_settings.MONGO_DB == "langchain"
-            assert default_settings.CHECKPOINT_COLLECTION == "checkpoints"
-            assert default_settings.SESSIONS_COLLECTION == "user_sessions"
-            assert default_settings.OPENAI_MODEL == "gpt-4o-mini"
-            assert default_settings.JWT_SECRET == "supersecret"
-            assert default_settings.LANGSMITH_TRACING is False
+        default_settings = Settings(
+            HOST="0.0.0.0",
+            PORT=8000,
+            MONGO_DB="langchain",
+            CHECKPOINT_COLLECTION="checkpoints",
+            SESSIONS_COLLECTION="user_sessions",
+            OPENAI_MODEL="gpt-4o-mini",
+            JWT_SECRET="supersecret",
+            LANGSMITH_TRACING=False,
+        )
+
+        assert default_settings.HOST == "0.0.0.0"
+        assert default_settings.PORT == 8000
+        assert default_settings.MONGO_DB == "langchain"
+        assert default_settings.CHECKPOINT_COLLECTION == "checkpoints"
+        assert default_settings.SESSIONS_COLLECTION == "user_sessions"
+        assert default_settings.OPENAI_MODEL == "gpt-4o-mini"
+        assert default_settings.JWT_SECRET == "supersecret"
+        assert default_settings.LANGSMITH_TRACING is False
 
     def test_env_override(self):
         env_vars = {
@@ -55,20 +50,23 @@ class TestSettings:
             "JWT_SECRET": "custom-secret",
         }
 
-        with patch.dict(os.environ, env_vars, clear=False):
-            from config.settings import Settings
-            settings = Settings()
+        settings = settings_for(tuple(sorted(env_vars.items())))
 
-            assert settings.HOST == "127.0.0.1"
-            assert settings.PORT == 9000
-            assert settings.MONGO_URI == "mongodb://custom:27017"
-            assert settings.MONGO_DB == "custom_db"
-            assert settings.OPENAI_API_KEY == "test-key"
-            assert settings.JWT_SECRET == "custom-secret"
+        assert settings.HOST == "127.0.0.1"
+        assert settings.PORT == 9000
+        assert settings.MONGO_URI == "mongodb://custom:27017"
+        assert settings.MONGO_DB == "custom_db"
+        assert settings.OPENAI_API_KEY == "test-key"
+        assert settings.JWT_SECRET == "custom-secret"
 
-    def test_get_settings_cached(self):
-        from config.settings import get_settings
+    def test_cors_origins_from_env(self):
+        env_vars = {"CORS_ORIGINS": '["https://app.example.com"]'}
 
+        settings = settings_for(tuple(sorted(env_vars.items())))
+
+        assert settings.CORS_ORIGINS == ["https://app.example.com"]
+
+    def test_get_settings_cached(self):
         settings1 = get_settings()
         settings2 = get_settings()
 
@@ -81,10 +79,8 @@ class TestSettings:
             "LANGSMITH_PROJECT": "test-project",
         }
 
-        with patch.dict(os.environ, env_vars, clear=False):
-            from config.settings import Settings
-            settings = Settings()
+        settings = settings_for(tuple(sorted(env_vars.items())))
 
-            assert settings.LANGSMITH_TRACING is True
-            assert settings.LANGSMITH_API_KEY == "ls-key"
-            assert settings.LANGSMITH_PROJECT == "test-project"
+        assert settings.LANGSMITH_TRACING is True
+        assert settings.LANGSMITH_API_KEY == "ls-key"
+        assert settings.LANGSMITH_PROJECT == "test-project"
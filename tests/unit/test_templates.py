@@ -0,0 +1,32 @@
+import os
+import stat
+
+import pytest
+
+from config.settings import get_settings
+from modules.web.http_handlers.templates import get_templates
+
+pytestmark = pytest.mark.unit
+
+
+class TestTemplates:
+    @pytest.fixture(autouse=True)
+    def fresh_templates(self):
+        get_settings.cache_clear()
+        get_templates.cache_clear()
+        yield
+        get_settings.cache_clear()
+        get_templates.cache_clear()
+
+    @pytest.mark.parametrize("auto_reload", [True, False])
+    def test_auto_reload_follows_settings(self, monkeypatch: pytest.MonkeyPatch, auto_reload: bool):
+        monkeypatch.setenv("TEMPLATES_AUTO_RELOAD", str(auto_reload))
+
+        assert get_templates().env.auto_reload is auto_reload
+
+    def test_bytecode_cache_dir_is_private(self):
+        directory = get_templates().env.bytecode_cache.directory
+
+        info = os.stat(directory)
+        assert info.st_uid == os.getuid()
+        assert stat.S_IMODE(info.st_mode) == 0o700
@@ -0,0 +1,56 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from modules.web.http_handlers import auth
+from modules.web.services.auth_service import AuthService
+
+pytestmark = pytest.mark.unit
+
+
+class TestWebAuthForms:
+    @pytest.fixture
+    def auth_service(self) -> MagicMock:
+        service = MagicMock(spec=AuthService)
+        service.register = AsyncMock(return_value={"user_id": "user_123"})
+        service.login = AsyncMock(return_value="token")
+        return service
+
+    async def test_register_invalid_email_renders_fragment(self, auth_service: MagicMock):
+        response = await auth.register(
+            request=None,
+            name="Test",
+            email="not-an-email",
+            password="secret123",
+            password_confirm="secret123",
+            auth_service=auth_service,
+        )
+
+        assert response.status_code == 200
+        assert response.body == auth.INVALID_EMAIL_HTML
+        auth_service.register.assert_not_awaited()
+
+    async def test_register_normalizes_email(self, auth_service: MagicMock):
+        response = await auth.register(
+            request=None,
+            name="Test",
+            email="  Test@Example.COM ",
+            password="secret123",
+            password_confirm="secret123",
+            auth_service=auth_service,
+        )
+
+        assert response.body == auth.REGISTER_SUCCESS_HTML
+        auth_service.register.assert_awaited_once_with("Test", "test@example.com", "secret123")
+
+    async def test_login_invalid_email_renders_fragment(self, auth_service: MagicMock):
+        response = await auth.login(
+            request=None,
+            email="not-an-email",
+            password="secret123",
+            auth_service=auth_service,
+        )
+
+        assert response.status_code == 200
+        assert response.body == auth.LOGIN_FAILED_HTML
+        auth_service.login.assert_not_awaited()